@@ -14,7 +14,7 @@ LOGGER = logger.configure()
 def initialize_api(app: FastAPI):
 
 	@app.post('/sd-mm/set-preview/')
-	async def set_preview(type: str, filename: str, index: int):
+	def set_preview(type: str, filename: str, index: int):
 		''' Sets the preview image for the given model '''
 
 		LOGGER.debug(f"API -> set_preview: {type}, {filename}, {index}")
@@ -22,7 +22,7 @@ def initialize_api(app: FastAPI):
 		model.select_preview(index)
 
 	@app.post('/sd-mm/delete-image/')
-	async def delete_image(type: str, filename: str, index: int):
+	def delete_image(type: str, filename: str, index: int):
 		''' Deletes the image at the given index for the given model '''
 
 		LOGGER.debug(f"API -> delete_image: {type}, {filename}, {index}")
@@ -30,14 +30,14 @@ def initialize_api(app: FastAPI):
 		model.remove_image(index)
 
 	@app.post('/sd-mm/add-image/')
-	async def add_image(type: str, filename: str, image: str):
+	def add_image(type: str, filename: str, image: str):
 		''' Adds the image to the given model '''
 
 		LOGGER.debug(f"API -> add_image: {type}, {filename}, {image}")
 		model_type = civitai.Model.Type[type]
 
-		for model_filename in sd_webui.model.filenames(model_type):
-			if model_filename.full.lower() == filename.lower():
-				model = local.Model.get(model_type, model_filename)
-				model.add_custom_image(Path(image), True)
-				break
\ No newline at end of file
+		# Look up the model through the lowercase filename index
+		model_filename = sd_webui.model.filename_index(model_type).get(filename.lower())
+		if model_filename is not None:
+			model = local.Model.get(model_type, model_filename)
+			model.add_custom_image(Path(image), True)
\ No newline at end of file
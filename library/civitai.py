@@ -1,21 +1,139 @@
 import re
 import time
+import hashlib
 import requests
+import threading
 from enum import Enum
 from pathlib import Path
 from pydantic import BaseModel
-from typing import Optional, Any
+from typing import Optional, Any, cast
+from requests.adapters import HTTPAdapter, Retry
+
+# Optional fast json parser, shipped with gradio
+try:
+	import orjson
+except ImportError:
+	orjson = None
 
 # Extension Library
+from library import paths
 from library import logger
 from library import utilities
 from library.settings import Settings
+from library.settings import EXTENSION_ID
 
 # Logger
 LOGGER = logger.configure()
 
-# Model dictionary of json data
-MODEL_JSON_DATA: dict[int, dict] = {}
+# Precompiled hot patterns
+WIDTH_PATTERN    = re.compile(r'\/width=\d+')
+MODEL_ID_PATTERN = re.compile(r'\/models\/(\d+)')
+
+# Shared session so sequential API calls reuse the same keep-alive connection
+SESSION = requests.Session()
+SESSION.headers['User-Agent'] = EXTENSION_ID
+SESSION.mount('https://', HTTPAdapter \
+(
+	pool_connections= 4,
+	pool_maxsize= 20,
+	max_retries= Retry(total= 3, backoff_factor= 0.5, status_forcelist= [502, 503, 504])
+))
+
+# Optional HTTP/2 client for API calls, used when httpx and its h2 extra are installed
+try:
+	import h2
+	import httpx
+	HTTP2_CLIENT = httpx.Client \
+	(
+		http2= True,
+		timeout= 30,
+		headers= {'User-Agent': EXTENSION_ID},
+		limits= httpx.Limits(max_connections= 10, max_keepalive_connections= 10)
+	)
+except ImportError:
+	HTTP2_CLIENT = None
+
+def api_get(url: str, headers: dict[str, str]= {}):
+	''' Send a GET request to the API, multiplexed over HTTP/2 when available '''
+
+	if HTTP2_CLIENT is not None:
+		return HTTP2_CLIENT.get(url, headers= headers)
+	return SESSION.get(url, headers= headers)
+
+def api_post(url: str, payload: Any):
+	''' Send a POST request to the API, multiplexed over HTTP/2 when available '''
+
+	if HTTP2_CLIENT is not None:
+		return HTTP2_CLIENT.post(url, json= payload)
+	return SESSION.post(url, json= payload)
+
+class TokenBucket:
+	''' Token bucket rate limiter shared by all Civitai API requests '''
+
+	def __init__(self, capacity= 2):
+		self._lock = threading.Lock()
+		self._capacity = capacity
+		self._tokens = float(capacity)
+		self._updated = time.monotonic()
+
+	@property
+	def _refill_rate(self):
+		''' Tokens refilled per second, derived from the request delay setting '''
+
+		delay = Settings.request_delay()
+		return 1 / delay if delay > 0 else float('inf')
+
+	def _refill(self):
+		''' Add the tokens accumulated since the last update '''
+
+		now = time.monotonic()
+		if now > self._updated:
+			self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._refill_rate)
+		self._updated = max(self._updated, now)
+
+	def acquire(self, tokens= 1):
+		''' Take tokens from the bucket, sleeping only when none are available '''
+
+		while True:
+			with self._lock:
+				self._refill()
+				if self._tokens >= tokens:
+					self._tokens -= tokens
+					return
+
+				# Sleep out a drain window and never busy-spin on a zero wait
+				now = time.monotonic()
+				wait = (tokens - self._tokens) / self._refill_rate
+				wait = max(wait, self._updated - now, 0.05)
+			LOGGER.debug(f'Waiting {wait:.2f} seconds to avoid rate limiting')
+			time.sleep(wait)
+
+	def drain(self, seconds: float):
+		''' Empty the bucket and delay the next refill by the given time '''
+
+		with self._lock:
+			self._tokens = 0
+			self._updated = time.monotonic() + seconds
+
+# Rate limiter for the Civitai API
+BUCKET = TokenBucket()
+
+# Seconds during which a cached response is served without revalidation
+CACHE_TTL = 300
+
+def cache_file(url: str):
+	''' Response cache file path for the given url '''
+	return paths.CACHE_DIR / f'{hashlib.sha1(url.encode()).hexdigest()}.json'
+
+def load_cached_response(url: str) -> dict[str, Any] | None:
+	''' Load a cached API response for the given url '''
+	return utilities.load_json(cache_file(url))
+
+def store_cached_response(url: str, etag: str, json: Any):
+	''' Store an API response and its ETag for the given url '''
+
+	paths.CACHE_DIR.mkdir(exist_ok= True)
+	utilities.store_json(cache_file(url), {'etag': etag, 'time': time.time(), 'json': json})
 
 class Api(Enum):
 	''' Civitai API endpoints'''
@@ -35,31 +153,68 @@ class Api(Enum):
 	def request(self, value: str | int):
 		''' Sends a request to the endpoint with the given value appended '''
 
-		request = requests.get(self.with_value(value))
+		url = self.with_value(value)
+		cached = load_cached_response(url)
+
+		# Serve fresh cache entries directly, skipping the request and its rate-limit token
+		if cached is not None and time.time() - cached.get('time', 0) < CACHE_TTL:
+			LOGGER.debug(f'Serving fresh cached response')
+			return cached['json']
+
+		# Revalidate a cached response through its ETag
+		headers = {'If-None-Match': cached['etag']} if cached is not None else {}
+
+		BUCKET.acquire()
+		request = api_get(url, headers)
+
+		# Serve the cached json when the resource has not changed
+		if request.status_code == 304 and cached is not None:
+			LOGGER.debug(f'Resource not modified, using cached response')
+			return cached['json']
+
+		# Cache responses that can be revalidated later
+		json = self.handle_response(request)
+		if json is not None and request.headers.get('ETag', '') != '':
+			store_cached_response(url, request.headers['ETag'], json)
+		return json
+
+	def request_json(self, payload: Any):
+		''' Sends a POST request to the endpoint with the given json payload '''
+
+		BUCKET.acquire()
+		request = api_post(self.value, payload)
 		return self.handle_response(request)
 
 	@classmethod
-	def handle_response(cls, response: requests.Response):
-		''' Handles a json response from the Civitai API '''
+	def handle_response(cls, response: Any):
+		''' Handles a json response from the Civitai API (requests or httpx) '''
 
 		LOGGER.debug(f'Handling response [{response.status_code}]')
 		json: dict[str, Any] | None = None
 
-		if response.ok:
+		if 200 <= response.status_code < 300:
 			try:
-				json = response.json()
+				json = orjson.loads(response.content) if orjson is not None else response.json()
 			except Exception as e:
 				LOGGER.error('Failed to parse json response')
 				LOGGER.error(e)
 		else:
 			if response.status_code == 404:
 				LOGGER.debug('Requested resource not found')
+			elif response.status_code == 429:
+
+				# Respect the Retry-After header by draining the rate limiter
+				# The header may also hold an HTTP-date, fall back to the request delay
+				try:
+					retry_after = float(response.headers.get('Retry-After', Settings.request_delay()))
+				except ValueError:
+					retry_after = Settings.request_delay()
+				LOGGER.warning(f'Rate limited by Civitai, backing off for {retry_after} seconds')
+				BUCKET.drain(retry_after)
 			else:
 				LOGGER.error(f'Request failed [{response.status_code}]')
 				LOGGER.error(response.text)
 
-		LOGGER.debug(f'Waiting {Settings.request_delay()} seconds to avoid rate limiting')
-		time.sleep(Settings.request_delay())
 		return json
 
 class Image(BaseModel):
@@ -84,7 +239,7 @@ class Image(BaseModel):
 	@property
 	def raw_url(self):
 		''' The raw url of the image (without width limit) '''
-		return re.sub(r'\/width=\d+', '', self.url)
+		return WIDTH_PATTERN.sub('', self.url)
 
 	@property
 	def custom_url(self):
@@ -116,9 +271,9 @@ class File(BaseModel):
 			PICKLETENSOR = 'PickleTensor'
 			OTHER        = 'Other'
 
-		fp:     Fp     | None
-		size:   Size   | None
-		format: Format | None
+		fp:     Fp     | None = None
+		size:   Size   | None = None
+		format: Format | None = None
 
 	class Hashes(BaseModel):
 		AutoV1: str = ''
@@ -180,8 +335,31 @@ class Version(BaseModel):
 	name:         str
 	trainedWords: list[str]
 	model:        Optional['Model'] = None
-	files:        list[File]
-	images:       list[Image]
+
+	def __init__(self, **data):
+		super().__init__(**data)
+
+		# Store raw file and image data, validated lazily on first access
+		object.__setattr__(self, '_raw_files', data.get('files', []))
+		object.__setattr__(self, '_raw_images', data.get('images', []))
+		object.__setattr__(self, '_files', None)
+		object.__setattr__(self, '_images', None)
+
+	@property
+	def files(self) -> list[File]:
+		''' Files of the model version '''
+
+		if self._files is None:
+			object.__setattr__(self, '_files', [File(**file) for file in self._raw_files])
+		return cast(list[File], self._files)
+
+	@property
+	def images(self) -> list[Image]:
+		''' Images of the model version '''
+
+		if self._images is None:
+			object.__setattr__(self, '_images', [Image(**image) for image in self._raw_images])
+		return cast(list[Image], self._images)
 
 	@property
 	def full_name(self):
@@ -217,9 +395,27 @@ class Version(BaseModel):
 		''' Requests a model version from Civitai by its hash '''
 
 		LOGGER.debug(f'Requesting model version info from Civitai by hash [{hash[:10]}]')
-		json = Api.GET_VERSION_BY_HASH.request(hash)
-		if json is None: return None
-		return cls(**json)
+		return cls.request_by_hashes([hash]).get(hash.lower())
+
+	@classmethod
+	def request_by_hashes(cls, hashes: list[str], batch_size= 100) -> dict[str, 'Version']:
+		''' Requests model versions from Civitai by their hashes, batched into single requests '''
+
+		versions: dict[str, Version] = {}
+		for start in range(0, len(hashes), batch_size):
+			batch = hashes[start:start + batch_size]
+
+			LOGGER.debug(f'Requesting model version info from Civitai for {len(batch)} hashes')
+			json = Api.GET_VERSION_BY_HASH.request_json(batch)
+			if json is None: continue
+
+			# Key each version by the hashes of its files
+			for data in json if isinstance(json, list) else [json]:
+				version = cls(**data)
+				for file in version.files:
+					for hash in (file.hash, file.autov2):
+						if hash != '': versions[hash.lower()] = version
+		return versions
 
 class Model(BaseModel):
 	''' Civitai model retrieved from the API '''
@@ -264,15 +460,27 @@ class Model(BaseModel):
 	def __init__(self, **data):
 		super().__init__(**data)
 
-		# Store raw json response
-		if self.id is not None:
-			MODEL_JSON_DATA[self.id] = data
+		# Keep the raw json response on the instance, released with it
+		object.__setattr__(self, '_raw_data', data)
+
+	def files_by_hash(self) -> dict[str, tuple['Version', 'File']]:
+		''' Map of file hashes to their version and file, built on first use '''
+
+		index = getattr(self, '_files_by_hash', None)
+		if index is None:
+			index = {}
+			for version in self.versions:
+				for file in version.files:
+					if file.hash != '':
+						index.setdefault(file.hash, (version, file))
+			object.__setattr__(self, '_files_by_hash', index)
+		return index
 
 	def store_raw_json(self, file_path: Path):
 		''' Stores the raw json response to the specified path '''
 
 		if self.id is not None:
-			return utilities.store_json(file_path, MODEL_JSON_DATA[self.id])
+			return utilities.store_json(file_path, self._raw_data)
 
 	@staticmethod
 	def load_raw_json(file_path: Path):
@@ -295,7 +503,7 @@ class Model(BaseModel):
 		LOGGER.debug(f'Requesting model info from Civitai by url [{url}]')
 
 		# Parse model ID from URL
-		search = re.search(rf'\/models\/(\d+)', url)
+		search = MODEL_ID_PATTERN.search(url)
 		if search is None:
 			LOGGER.error(f'Failed to parse model ID from url [{url}]')
 			return None
@@ -312,5 +520,8 @@ class Model(BaseModel):
 		else:
 			return cls.request_by_url(url_or_id)
 
-# Update forward references
-Version.update_forward_refs()
\ No newline at end of file
+# Update forward references, through the Rust-backed validators on pydantic v2
+if hasattr(Version, 'model_rebuild'):
+	Version.model_rebuild()
+else:
+	Version.update_forward_refs()
\ No newline at end of file
@@ -1,11 +1,13 @@
 import re
+import os
+import time
 import tempfile
 import requests
 import threading
 from tqdm import tqdm
 from enum import Enum
+from typing import cast
 from pathlib import Path
-from collections import deque
 
 # Extension Library
 from library import paths
@@ -18,6 +20,52 @@ from library.utilities import Filename
 # Logger
 LOGGER = logger.configure()
 
+# Segmented download parameters
+SEGMENT_COUNT    = 4
+SEGMENT_MIN_SIZE = 32 * 1024 * 1024
+DOWNLOAD_CHUNK   = 4 * 1024 * 1024
+WRITE_BATCH      = 4
+
+# Maximum number of files downloaded concurrently
+CONCURRENT_DOWNLOADS = 4
+
+# Dedicated session for file downloads, pooled per the download concurrency
+SESSION = requests.Session()
+SESSION.mount('https://', requests.adapters.HTTPAdapter \
+(
+	pool_connections= 4,
+	pool_maxsize= CONCURRENT_DOWNLOADS * SEGMENT_COUNT,
+	max_retries= requests.adapters.Retry \
+	(
+		total= 5,
+		backoff_factor= 1,
+		status_forcelist= [429, 502, 503, 504],
+		respect_retry_after_header= True
+	)
+))
+
+# Precompiled header patterns
+IMAGE_TYPE_PATTERN  = re.compile(r'image\/([\w]+)')
+DISPOSITION_PATTERN = re.compile(r'filename="([\w.]+)"')
+
+def preallocate_file(file, size: int):
+	''' Preallocate a file on disk when its final size is known '''
+
+	if size <= 0:
+		return
+	if hasattr(os, 'posix_fallocate'):
+		os.posix_fallocate(file.fileno(), 0, size)
+	else:
+		file.truncate(size)
+
+def flush_chunks(fd: int, chunks: list[bytes]):
+	''' Write the batched chunks with a single syscall '''
+
+	if hasattr(os, 'writev'):
+		os.writev(fd, chunks)
+	else:
+		os.write(fd, b''.join(chunks))
+
 class File:
 	''' File entity used for downloading files '''
 
@@ -45,8 +93,8 @@ class File:
 
 	@property
 	def mean_speed(self):
-		''' Mean download speed in bytes per second '''
-		return sum(self.speed) / len(self.speed) if len(self.speed) > 0 else 0
+		''' Smoothed download speed in bytes per second '''
+		return self._ewma
 
 	@property
 	def speed_hr(self):
@@ -83,7 +131,8 @@ class File:
 		LOGGER.debug(f'Initializing downloader for: {url}')
 
 		# Get the download directory
-		if filename.extension == '.png':
+		self.is_image = filename.extension == '.png'
+		if self.is_image:
 			directory = paths.IMAGES_DIR
 		else:
 			directory = paths.default_directory(type.name)
@@ -103,11 +152,15 @@ class File:
 		# Download info
 		self.downloaded: int = 0
 		self.estimated_time: float = 0
-		self.speed: deque[float] = deque(maxlen= 10)
+
+		# Speed estimation info
+		self._ewma: float = 0
+		self._rate_time: float = 0
+		self._rate_bytes: int = 0
 
 		# Make the request
 		try:
-			self.response = requests.get(url, stream= True)
+			self.response = SESSION.get(url, stream= True, timeout= (10, 60))
 			if not self.response.ok:
 				raise Exception(f'HTTP status code [{self.response.status_code}]')
 		except Exception as e:
@@ -117,15 +170,16 @@ class File:
 		content_type = self.response.headers.get('Content-Type', '')
 		disposition = self.response.headers.get('Content-Disposition', '')
 		self.file_size = int(self.response.headers.get('Content-Length', 0))
+		self.accept_ranges = self.response.headers.get('Accept-Ranges', '') == 'bytes'
 
 		# If the file is an image, extract the file extension from the content type
 		if 'image' in content_type:
-			search = re.search(r'image\/([\w]+)', content_type)
+			search = IMAGE_TYPE_PATTERN.search(content_type)
 			extension = f'.{search.group(1)}' if search is not None else None
 
 		# Otherwise, extract the file extension from the content disposition
 		else:
-			search = re.search(r'filename="([\w.]+)"', disposition)
+			search = DISPOSITION_PATTERN.search(disposition)
 			extension = Filename(search.group(1)).extension if search is not None else None
 
 		# Prefer the header file extension over the provided filename extension
@@ -133,14 +187,15 @@ class File:
 		self.filename = filename.with_extension(extension)
 
 		# Find a unique file name if the file is not an image
-		if not directory.samefile(paths.IMAGES_DIR):
+		if not self.is_image:
 
-			# Initialize new filename and index
+			# Initialize new filename, index and existing name set
 			new_filename = self.filename
+			existing_names = frozenset(sd_webui.model.names(type))
 			index = 1
 
 			# Find a new name if there is a name conflict
-			while new_filename.name in sd_webui.model.names(type):
+			while new_filename.name in existing_names:
 				new_filename = self.filename.with_index(index, '_')
 				index += 1
 			self.filename = new_filename
@@ -173,17 +228,102 @@ class File:
 		if self.temp_file is not None and self.temp_file.exists():
 			self.temp_file.unlink()
 
+	def _download_stream(self, temp_file, progress_bar: tqdm, is_running: threading.Event):
+		''' Write the single streamed response to the temporary file '''
+
+		# Preallocate the temporary file and batch the chunk writes
+		preallocate_file(temp_file, self.file_size)
+		pending: list[bytes] = []
+
+		for chunk in self.response.iter_content(DOWNLOAD_CHUNK):
+
+			# Let the caller handle the cancellation
+			if not is_running.is_set():
+				yield; return
+
+			# Update the progress bar and batch the chunk for writing
+			length = len(chunk)
+			progress_bar.update(length)
+			pending.append(chunk)
+			self.downloaded += length
+
+			# Flush the batched chunks with a single syscall
+			if len(pending) >= WRITE_BATCH:
+				flush_chunks(temp_file.fileno(), pending)
+				pending.clear()
+			yield
+
+		# Flush the remaining chunks
+		if len(pending) > 0:
+			flush_chunks(temp_file.fileno(), pending)
+
+	def _download_segments(self, temp_file, progress_bar: tqdm, is_running: threading.Event):
+		''' Download the file with parallel range requests into the preallocated temporary file '''
+
+		# Preallocate the temporary file and discard the single streamed response
+		preallocate_file(temp_file, self.file_size)
+		self.response.close()
+
+		# Split the file into evenly sized segments
+		segment_size = self.file_size // SEGMENT_COUNT
+		ranges = [(index * segment_size, (index + 1) * segment_size - 1) for index in range(SEGMENT_COUNT)]
+		ranges[-1] = (ranges[-1][0], self.file_size - 1)
+
+		# Progress lock and worker errors
+		lock = threading.Lock()
+		errors: list[Exception] = []
+
+		def worker(start: int, end: int):
+			''' Download a single byte range into its slice of the file '''
+
+			try:
+				response = SESSION.get(self.url, headers= {'Range': f'bytes={start}-{end}'}, stream= True, timeout= (10, 60))
+				if response.status_code != 206:
+					raise Exception(f'HTTP status code [{response.status_code}]')
+
+				# Write the segment into its offset of the temporary file
+				with cast(Path, self.temp_file).open('r+b') as segment_file:
+					segment_file.seek(start)
+					for chunk in response.iter_content(DOWNLOAD_CHUNK):
+						if not is_running.is_set():
+							return
+						segment_file.write(chunk)
+						with lock:
+							progress_bar.update(len(chunk))
+							self.downloaded += len(chunk)
+			except Exception as e:
+				errors.append(e)
+
+		# Start the segment workers
+		threads = [threading.Thread(target= worker, args= file_range, daemon= True) for file_range in ranges]
+		for thread in threads:
+			thread.start()
+
+		# Yield while the workers are running
+		while any(thread.is_alive() for thread in threads):
+			time.sleep(0.2)
+			yield
+		for thread in threads:
+			thread.join()
+
+		# Report worker failures, the incomplete byte count marks the download as failed
+		for error in errors:
+			LOGGER.error(f'Segment download failed: {error}')
+		yield
+
 	def download(self, is_running: threading.Event):
 		''' Download the file while the running event is set '''
 
 		if not is_running.is_set() or self.status != File.Status.QUEUED:
 			return
 
-		# Mark as downloading
+		# Mark as downloading and start the speed estimation clock
 		self.status = File.Status.DOWNLOADING
+		self._rate_time = time.monotonic()
+		self._rate_bytes = self.downloaded
 
-		# Create the progress bar
-		progress_bar = tqdm(total= self.file_size, unit= 'iB', unit_scale= True)
+		# Create the progress bar, redrawn at most twice per second
+		progress_bar = tqdm(total= self.file_size, unit= 'iB', unit_scale= True, mininterval= 0.5)
 
 		# Change the file name if it already exists
 		if self.file.exists():
@@ -193,24 +333,34 @@ class File:
 		with tempfile.NamedTemporaryFile(dir= self.directory, delete= False) as temp_file:
 			self.temp_file = Path(temp_file.name)
 
-			# Iterate over the response content
-			for chunk in self.response.iter_content(1024 * 1024):
+			# Download large files with parallel range requests when supported
+			if self.accept_ranges and self.file_size >= SEGMENT_MIN_SIZE:
+				download_chunks = self._download_segments(temp_file, progress_bar, is_running)
+
+			# Otherwise iterate over the single response content
+			else:
+				download_chunks = self._download_stream(temp_file, progress_bar, is_running)
+
+			for _ in download_chunks:
 
 				# Stop the download if the running event is cleared
 				if not is_running.is_set():
 					progress_bar.close()
-					self.speed.clear()
+					self._ewma = 0
 					temp_file.close()
 					self.temp_file.unlink()
 					yield self; return
 
-				# Update the progress bar and write the chunk to the file
-				progress_bar.update(len(chunk))
-				temp_file.write(chunk)
+				# Update the speed estimate no more than four times per second
+				now = time.monotonic()
+				elapsed = now - self._rate_time
+				if elapsed > 0.25:
+					instant = (self.downloaded - self._rate_bytes) / elapsed
+					self._ewma = instant if self._ewma == 0 else 0.7 * self._ewma + 0.3 * instant
+					self._rate_time = now
+					self._rate_bytes = self.downloaded
 
-				# Update download info
-				self.downloaded += len(chunk)
-				self.speed.append(progress_bar.format_dict['rate'] or 0)
+				# Update the estimated remaining time
 				if self.file_size > 0:
 					mean_speed = self.mean_speed if self.mean_speed > 0 else 1
 					self.estimated_time = (self.file_size - self.downloaded) / mean_speed
@@ -222,7 +372,7 @@ class File:
 		if self.file_size == 0 or self.downloaded == self.file_size:
 
 			# If the file is an image, convert it to png
-			if self.directory.samefile(paths.IMAGES_DIR):
+			if self.is_image:
 				self.filename = self.filename.with_extension('.png')
 				self.temp_file = utilities.image_to_png(self.directory, Filename(self.temp_file.name))
 
@@ -241,7 +391,7 @@ class File:
 
 		# Close the progress bar and yield the final download info
 		progress_bar.close()
-		self.speed.clear()
+		self._ewma = 0
 		yield self
 
 class DownloadManager:
@@ -252,8 +402,11 @@ class DownloadManager:
 
 	def __init__(self):
 		self._running = threading.Event()
+		self._changed = threading.Event()
 		self._thread: threading.Thread
+		self._urls: set[str] = set()
 		self.files: list[File] = []
+		self.revision = 0
 
 	@classmethod
 	def instance(cls):
@@ -279,16 +432,30 @@ class DownloadManager:
 		''' Returns all files that are not complete '''
 		return [file for file in self.files if not file.complete]
 
+	def notify_change(self):
+		''' Mark the download state as changed and wake waiting consumers '''
+
+		self.revision += 1
+		self._changed.set()
+
+	def wait_change(self, timeout: float):
+		''' Wait until the download state changes or the timeout expires '''
+
+		changed = self._changed.wait(timeout)
+		self._changed.clear()
+		return changed
+
 	def enqueue(self, file: File):
 		''' Enqueues a file to be downloaded if it is not already '''
 
-		for existing_file in self.files:
-			if existing_file.url == file.url:
-				LOGGER.debug(f'File [{file.filename.full}] already in download queue')
-				return
+		if file.url in self._urls:
+			LOGGER.debug(f'File [{file.filename.full}] already in download queue')
+			return
 
 		LOGGER.debug(f'Enqueuing file: {file.filename.full}')
+		self._urls.add(file.url)
 		self.files.append(file)
+		self.notify_change()
 
 	def start(self):
 		''' Starts the download manager '''
@@ -314,10 +481,11 @@ class DownloadManager:
 			LOGGER.debug('Download manager is not running')
 			return
 
-		# Stop the download thread
+		# Stop the download thread and release the pooled connections
 		self._running.clear()
 		self._thread.join()
 		self._clear()
+		SESSION.close()
 		LOGGER.debug('Download manager stopped')
 
 	def _clear(self):
@@ -325,24 +493,64 @@ class DownloadManager:
 
 		# Only clear the queue if the download manager is not running
 		if not self.running:
+			self._urls.clear()
 			self.files.clear()
 
 	def _download_thread(self):
 		''' The download thread '''
 
-		try:
-			for index, file in enumerate(self.files):
-				for current_file in file.download(self._running):
-					if not self.running:
-						break
-					self.files[index] = current_file
+		semaphore = threading.Semaphore(CONCURRENT_DOWNLOADS)
+		errors: list[Exception] = []
+
+		def drain(file: File):
+			''' Consume the download generator of a single file '''
+
+			try:
+				with semaphore:
+					last_notify = 0.0
+					for _ in file.download(self._running):
+
+						# Signal progress no more than four times per second
+						now = time.monotonic()
+						if now - last_notify >= 0.25:
+							last_notify = now
+							self.notify_change()
+						if not self.running:
+							break
+				self.notify_change()
+			except Exception as e:
+				errors.append(e)
+
+		# Download the queued files concurrently, picking up late enqueues
+		workers: list[threading.Thread] = []
+		index = 0
+		while True:
+
+			# Spawn a drain worker for every file appended since the last pass
+			while index < len(self.files):
+				worker = threading.Thread(target= drain, args= (self.files[index],), daemon= True)
+				workers.append(worker)
+				worker.start()
+				index += 1
 
-		except Exception as e:
+			# Finish once the queue is drained and every worker is done
+			if not self.running:
+				break
+			if index == len(self.files) and all(not worker.is_alive() for worker in workers):
+				break
+			time.sleep(0.1)
+		for worker in workers:
+			worker.join()
+
+		# Mark the remaining incomplete files as failed if any download raised
+		if len(errors) > 0:
 			for file in self.incomplete_files:
 				file.remove_temp_file()
 				file.status = File.Status.FAILED
-			LOGGER.error(f'Download thread failed: {e}')
+			for error in errors:
+				LOGGER.error(f'Download thread failed: {error}')
 
 		# Mark as stopped
 		self._running.clear()
+		self.notify_change()
 		LOGGER.debug('Download thread stopped')
\ No newline at end of file
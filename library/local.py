@@ -1,5 +1,10 @@
+import os
+import re
 import shutil
+import functools
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Any, cast
 
 # SD Webui Modules
@@ -21,44 +26,205 @@ LOGGER = logger.configure()
 # Model Cache
 MODEL_CACHE: dict[str, 'Model'] = {}
 
+# Scans Cache
+SCANS_CACHE: Optional[dict[str, Any]] = None
+SCANS_KEYS:  frozenset[str] = frozenset()
+SCANS_MTIME: Optional[float] = None
+SCANS_LOCK = threading.RLock()
+
+# Civitai Database Hash Index
+HASH_INDEX: Optional[dict[str, int]] = None
+HASH_INDEX_MTIME: Optional[float] = None
+
+# Images Directory Index
+IMAGES_INDEX: Optional[dict[str, list[Path]]] = None
+IMAGES_MTIME: Optional[float] = None
+IMAGES_GENERATION = 0
+
+# Installed Model Hash Index
+MODEL_HASH_INDEX: Optional[dict[str, list['Model']]] = None
+MODEL_HASH_GENERATION = 0
+
+# Cached list of all installed models
+ALL_MODELS_CACHE: Optional[list['Model']] = None
+ALL_MODELS_KEY:   Optional[tuple] = None
+ALL_MODELS_GENERATION = -1
+
+# Directory Entry Names Cache
+DIR_ENTRIES: dict[Path, tuple[Optional[float], frozenset[str]]] = {}
+
 def clear_cache():
-	''' Clear the model cache '''
+	''' Clear the model and scans caches '''
+	global SCANS_CACHE, SCANS_KEYS, SCANS_MTIME, HASH_INDEX, HASH_INDEX_MTIME, IMAGES_INDEX
+
 	MODEL_CACHE.clear()
+	SCANS_CACHE = None
+	SCANS_KEYS = frozenset()
+	SCANS_MTIME = None
+	HASH_INDEX = None
+	HASH_INDEX_MTIME = None
+	IMAGES_INDEX = None
+	invalidate_model_hash_index()
+	DIR_ENTRIES.clear()
+	sd_webui.FILENAME_INDEX.clear()
+	sd_webui.FILENAMES_CACHE.clear()
 	LOGGER.debug('Cleared Model Cache')
 
 def load_scans() -> dict[str, Any]:
 	''' Load dictionary of model scans from storage '''
-	return utilities.load_json(paths.SCANNED_FILE, {})
+	global SCANS_CACHE, SCANS_KEYS, SCANS_MTIME
+
+	# Reload the scans only when the file changed on disk
+	with SCANS_LOCK:
+		mtime = paths.SCANNED_FILE.stat().st_mtime if paths.SCANNED_FILE.exists() else None
+		if SCANS_CACHE is None or mtime != SCANS_MTIME:
+			SCANS_CACHE = utilities.load_json(paths.SCANNED_FILE, {})
+			SCANS_KEYS = frozenset(SCANS_CACHE)
+			SCANS_MTIME = mtime
+		return SCANS_CACHE
+
+def database_hash_index() -> dict[str, int]:
+	''' Map of file hashes to model IDs, built from the Civitai JSON database '''
+	global HASH_INDEX, HASH_INDEX_MTIME
+
+	# Rebuild the index only when the database directory changed
+	mtime = paths.DATABASE_DIR.stat().st_mtime if paths.DATABASE_DIR.exists() else None
+	if HASH_INDEX is None or mtime != HASH_INDEX_MTIME:
+		HASH_INDEX = {}
+		HASH_INDEX_MTIME = mtime
+
+		# Walk every file of every version of every database model
+		# The raw json is traversed directly to skip model validation
+		if paths.DATABASE_DIR.exists():
+			with os.scandir(paths.DATABASE_DIR) as entries:
+				for entry in entries:
+					if not entry.is_file() or not entry.name.endswith('.json'):
+						continue
+					data = utilities.load_json(Path(entry.path), {})
+					for version in data.get('modelVersions') or []:
+						for file in version.get('files') or []:
+							hash = file.get('hashes', {}).get('SHA256', '')
+							if hash != '':
+								HASH_INDEX[hash] = cast(int, data.get('id'))
+	return HASH_INDEX
+
+def invalidate_model_hash_index():
+	''' Drop the installed model hash index after a cache mutation '''
+	global MODEL_HASH_INDEX, MODEL_HASH_GENERATION
+	MODEL_HASH_INDEX = None
+	MODEL_HASH_GENERATION += 1
+
+def invalidate_images_index():
+	''' Drop the images directory index after a mutation '''
+	global IMAGES_INDEX, IMAGES_GENERATION
+	IMAGES_INDEX = None
+	IMAGES_GENERATION += 1
+
+def images_index() -> dict[str, list[Path]]:
+	''' Snapshot of the images directory, grouped by the prefix before the first dot '''
+	global IMAGES_INDEX, IMAGES_MTIME
+
+	# Rebuild the index only when the images directory changed
+	mtime = paths.IMAGES_DIR.stat().st_mtime if paths.IMAGES_DIR.exists() else None
+	if IMAGES_INDEX is None or mtime != IMAGES_MTIME:
+		IMAGES_INDEX = {}
+		IMAGES_MTIME = mtime
+
+		if paths.IMAGES_DIR.exists():
+			with os.scandir(paths.IMAGES_DIR) as entries:
+				for entry in entries:
+					prefix = entry.name.split('.', 1)[0]
+					IMAGES_INDEX.setdefault(prefix, []).append(Path(entry.path))
+	return IMAGES_INDEX
+
+# Markdown Template Placeholder
+PLACEHOLDER_PATTERN = re.compile(r'\{([A-Z_]+)\}')
+
+@functools.lru_cache(maxsize= None)
+def load_template(file: Path) -> str:
+	''' Load and cache a markdown template file '''
+	return file.read_text(encoding= 'utf-8')
+
+def fill_template(template: str, values: dict[str, str]) -> str:
+	''' Fill all template placeholders in a single pass '''
+	return PLACEHOLDER_PATTERN.sub(lambda match: values.get(match.group(1), match.group(0)), template)
+
+def directory_entries(directory: Path) -> frozenset[str]:
+	''' Set of entry names in a directory, used to batch existence checks '''
+
+	# Rescan the directory only when its mtime changed
+	mtime = directory.stat().st_mtime if directory.exists() else None
+	cached = DIR_ENTRIES.get(directory)
+	if cached is not None and cached[0] == mtime:
+		return cached[1]
+
+	names = frozenset(entry.name for entry in os.scandir(directory)) if mtime is not None else frozenset()
+	DIR_ENTRIES[directory] = (mtime, names)
+	return names
+
+def scan_keys() -> frozenset[str]:
+	''' Set of stored scan keys for fast membership tests '''
+
+	load_scans()
+	return SCANS_KEYS
 
 def save_scans(scans: dict[str, Any]):
 	''' Save dictionary of model scans to storage '''
-	utilities.store_json(paths.SCANNED_FILE, scans)
+	global SCANS_CACHE, SCANS_KEYS, SCANS_MTIME
+
+	with SCANS_LOCK:
+		utilities.store_json(paths.SCANNED_FILE, scans)
+		SCANS_CACHE = scans
+		SCANS_KEYS = frozenset(scans)
+		SCANS_MTIME = paths.SCANNED_FILE.stat().st_mtime
 
 def refresh_markdown():
 	''' Refresh markdown files for all installed models '''
 
-	for type in civitai.Model.Type:
-		for filename in sd_webui.model.filenames(type):
-			Model.get(type, filename).generate_markdown()
+	# Markdown generation is independent per model and dominated by file reads
+	models = Model.all()
+	workers = min(32, (os.cpu_count() or 1) * 4)
+	with ThreadPoolExecutor(max_workers= workers) as executor:
+		list(executor.map(Model.generate_markdown, models))
 	LOGGER.info('Refreshed all markdown files')
 
+def prehash(models: list['Model']):
+	''' Warm the SHA256 cache for the given models concurrently '''
+
+	# Only hash files whose stored hash is stale or missing
+	hashes = utilities.load_json(paths.HASHES_FILE, {})
+	files: list[Path] = []
+	for model in models:
+		if model.hash is not None:
+			continue
+		file = sd_webui.model.file(model.type, model.filename)
+		if file is None:
+			continue
+		stat = file.stat()
+		cached = hashes.get(model.key)
+		if cached is not None and cached['mtime'] == stat.st_mtime and cached['size'] == stat.st_size:
+			continue
+		files.append(file)
+
+	# Later ensure_hash calls are served from the warm cache
+	utilities.file_sha256_many(files)
+
 def purge_scans():
 	''' Purge stored scans from models that are no longer installed '''
 
 	# Get scans
 	scans = load_scans()
 
-	# Get installed models
-	installed = []
-	for type in civitai.Model.Type:
-		for filename in sd_webui.model.filenames(type):
-			installed.append(f'{type.name}/{filename.full}')
+	# Get installed model keys
+	installed = \
+	{
+		f'{type.name}/{filename.full}'
+		for type in civitai.Model.Type
+		for filename in sd_webui.model.filenames(type)
+	}
 
 	# Get non installed models
-	non_installed = []
-	for key in scans:
-		if key not in installed:
-			non_installed.append(key)
+	non_installed = [key for key in scans if key not in installed]
 
 	# Remove scans of non installed models
 	for key in non_installed:
@@ -77,6 +243,16 @@ class Model:
 		self.hash: str | None = None
 		self.filename = filename
 		self.type = type
+
+		# Memoized Civitai objects
+		self._civitai_model:   Optional[civitai.Model]   = None
+		self._civitai_version: Optional[civitai.Version] = None
+		self._civitai_file:    Optional[civitai.File]    = None
+
+		# Memoized installed model buckets
+		self._installed_buckets: Optional[tuple[list['Model'], list['Model']]] = None
+		self._buckets_generation = -1
+
 		self.load_scan()
 
 	def __hash__(self):
@@ -89,13 +265,16 @@ class Model:
 
 	def refresh_cache(self):
 		''' Refresh the model cache '''
+
 		MODEL_CACHE[self.key] = self
+		invalidate_model_hash_index()
 
 	def remove_cache(self):
 		''' Remove the model from the cache '''
 
 		if self.key in MODEL_CACHE:
 			del MODEL_CACHE[self.key]
+		invalidate_model_hash_index()
 
 	@staticmethod
 	def get(type: civitai.Model.Type, filename: Filename):
@@ -123,7 +302,38 @@ class Model:
 	@classmethod
 	def all(cls):
 		''' List all installed models '''
-		return [model for type in civitai.Model.Type for model in cls.by_type(type)]
+		global ALL_MODELS_CACHE, ALL_MODELS_KEY, ALL_MODELS_GENERATION
+
+		# The cached filename lists change identity when a type is reloaded
+		key = tuple(sd_webui.FILENAMES_CACHE.get(type) for type in civitai.Model.Type)
+		stale = \
+		(
+			ALL_MODELS_CACHE is None or
+			ALL_MODELS_GENERATION != MODEL_HASH_GENERATION or
+			ALL_MODELS_KEY is None or
+			any(a is not b for a, b in zip(key, ALL_MODELS_KEY))
+		)
+
+		if stale:
+			ALL_MODELS_CACHE = [model for type in civitai.Model.Type for model in cls.by_type(type)]
+			ALL_MODELS_KEY = tuple(sd_webui.FILENAMES_CACHE.get(type) for type in civitai.Model.Type)
+			ALL_MODELS_GENERATION = MODEL_HASH_GENERATION
+		return ALL_MODELS_CACHE
+
+	@classmethod
+	def by_hash_index(cls) -> dict[str, list['Model']]:
+		''' Map of file hashes to installed models, built once per cache generation '''
+		global MODEL_HASH_INDEX
+
+		if MODEL_HASH_INDEX is None:
+
+			# Publish only the fully built index, concurrent readers see all or nothing
+			index: dict[str, list['Model']] = {}
+			for model in cls.all():
+				if model.hash is not None:
+					index.setdefault(model.hash, []).append(model)
+			MODEL_HASH_INDEX = index
+		return MODEL_HASH_INDEX
 
 	@property
 	def key(self):
@@ -193,7 +403,10 @@ class Model:
 	@property
 	def missing_images(self) -> list[Path]:
 		''' Paths to missing Civitai model image files '''
-		return [file for file in self.image_files if not file.exists()]
+
+		# One directory scan replaces an existence check per image file
+		names = directory_entries(paths.IMAGES_DIR)
+		return [file for file in self.image_files if file.name not in names]
 
 	@property
 	def vae_symlink_file(self):
@@ -215,7 +428,8 @@ class Model:
 	def all_images(self):
 		''' Paths to all model images '''
 
-		images = [file for file in paths.IMAGES_DIR.glob(f'{self.image_key}.*')]
+		bucket = images_index().get(self.image_key.split('.', 1)[0], [])
+		images = [file for file in bucket if file.name.startswith(f'{self.image_key}.')]
 		images.sort(key= lambda file: cast(int, Filename(file.name).get_index()))
 		return images
 
@@ -242,7 +456,10 @@ class Model:
 	@property
 	def downloaded_images(self):
 		''' Paths to the Civitai model image files that are downloaded '''
-		return [image for image in self.image_files if image.exists()]
+
+		# One directory scan replaces an existence check per image file
+		names = directory_entries(paths.IMAGES_DIR)
+		return [image for image in self.image_files if image.name in names]
 
 	@property
 	def preview_index(self):
@@ -250,37 +467,44 @@ class Model:
 
 		if not self.has_preview:
 			return None
-		for image in self.all_images:
-			if image.samefile(self.preview_file):
-				return Filename(image.name).get_index()
+
+		# Resolve the symlink target once instead of comparing against every image
+		target_name = self.preview_target_name()
+		if target_name.startswith(f'{self.image_key}.'):
+			return Filename(target_name).get_index()
 		return None
 
 	@property
 	def civitai_model(self) -> civitai.Model:
 		''' Get Civitai model '''
 
-		if self.has_json:
-			return civitai.Model.load_raw_json(self.json_file)
-		raise ValueError(f'Model "{self.filename.full}" is not in Civitai')
+		if self._civitai_model is None:
+			if not self.has_json:
+				raise ValueError(f'Model "{self.filename.full}" is not in Civitai')
+			self._civitai_model = civitai.Model.load_raw_json(self.json_file)
+		return self._civitai_model
 
 	@property
 	def civitai_version(self) -> civitai.Version:
 		''' Get Civitai model version '''
 
-		for version in self.civitai_model.versions:
-			for file in version.files:
-				if file.hash == self.hash:
-					return version
-		raise ValueError(f'Could not find Civitai model version for "{self.filename.full}"')
+		# Resolve the version and file pair through the model hash index
+		if self._civitai_version is None:
+			pair = self.civitai_model.files_by_hash().get(cast(str, self.hash))
+			if pair is None:
+				raise ValueError(f'Could not find Civitai model version for "{self.filename.full}"')
+			self._civitai_version, self._civitai_file = pair
+		return self._civitai_version
 
 	@property
 	def civitai_file(self) -> civitai.File:
 		''' Get Civitai model file '''
 
-		for file in self.civitai_version.files:
-			if file.hash == self.hash:
-				return file
-		raise ValueError(f'Could not find Civitai model file for "{self.filename.full}"')
+		if self._civitai_file is None:
+			self.civitai_version
+		if self._civitai_file is None:
+			raise ValueError(f'Could not find Civitai model file for "{self.filename.full}"')
+		return self._civitai_file
 
 	@property
 	def civitai_vae_file(self):
@@ -295,27 +519,31 @@ class Model:
 	@property
 	def has_scan(self):
 		''' Whether the model has a stored scan '''
-		return self.key in load_scans()
+		return self.key in scan_keys()
 
 	@property
 	def has_json(self):
 		''' Whether the model has an existing Civitai JSON file '''
-		return self.in_civitai and self.json_file.exists()
+		return self.in_civitai and self.json_file.name in directory_entries(paths.DATABASE_DIR)
 
 	@property
 	def has_preview(self):
 		''' Whether the model has an existing preview image file '''
+
+		# The name check batches the common miss, exists() rejects dangling symlinks
+		if self.preview_file.name not in directory_entries(self.preview_file.parent):
+			return False
 		return self.preview_file.exists()
 
 	@property
 	def has_markdown(self):
 		''' Whether the model has an existing markdown information file '''
-		return self.markdown_file.exists()
+		return self.markdown_file.name in directory_entries(self.markdown_file.parent)
 
 	@property
 	def has_vae_symlink(self):
 		''' Whether the model has an existing VAE symlink file '''
-		return self.vae_symlink_file.exists()
+		return self.vae_symlink_file.name in directory_entries(self.vae_symlink_file.parent)
 
 	@property
 	def has_nsfw_preview(self):
@@ -323,7 +551,10 @@ class Model:
 
 		if not self.has_preview:
 			return False
-		return not utilities.path_in_list(self.preview_file, self.all_safe_images)
+
+		# Compare the symlink target name against the safe image names
+		safe_names = {image.name for image in self.all_safe_images}
+		return self.preview_target_name() not in safe_names
 
 	@property
 	def has_missing_preview(self):
@@ -356,21 +587,38 @@ class Model:
 			return False
 		return not any([model.is_latest and not model.is_vae for model in self.installed_by_model])
 
+	def installed_buckets(self) -> tuple[list['Model'], list['Model']]:
+		''' Installed models sharing the Civitai model and version, found in one traversal '''
+
+		# Reuse the memo while the hash index generation is unchanged
+		if self._installed_buckets is not None and self._buckets_generation == MODEL_HASH_GENERATION:
+			return self._installed_buckets
+
+		index = self.by_hash_index()
+		version = self.civitai_version
+		by_model:   list[Model] = []
+		by_version: list[Model] = []
+
+		# Collects the installed models matching any file of the Civitai model
+		for civitai_version in self.civitai_model.versions:
+			for file in civitai_version.files:
+				for model in index.get(file.hash, []):
+					if model not in by_model:
+						by_model.append(model)
+					if civitai_version is version and model not in by_version:
+						by_version.append(model)
+
+		self._installed_buckets = (by_model, by_version)
+		self._buckets_generation = MODEL_HASH_GENERATION
+		return self._installed_buckets
+
 	@property
 	def installed_by_model(self) -> list['Model']:
 		''' List of installed models belonging to the same Civitai model '''
 
 		if not self.in_civitai:
 			return []
-		model_hashes: list[str] = []
-
-		# Finds the hashes of all files belonging to the Civitai model
-		for version in self.civitai_model.versions:
-			for file in version.files:
-				model_hashes.append(file.hash)
-
-		# Keeps only the installed models with matching hashes
-		return [model for model in self.all() if model.hash in model_hashes]
+		return self.installed_buckets()[0]
 
 	@property
 	def installed_by_version(self) -> list['Model']:
@@ -378,14 +626,7 @@ class Model:
 
 		if not self.in_civitai:
 			return []
-		version_hashes: list[str] = []
-
-		# Finds the hashes of all files belonging to the Civitai model version
-		for file in self.civitai_version.files:
-			version_hashes.append(file.hash)
-
-		# Keeps only the installed models with matching hashes
-		return [model for model in self.all() if model.hash in version_hashes]
+		return self.installed_buckets()[1]
 
 	@property
 	def tags(self):
@@ -411,11 +652,9 @@ class Model:
 		vae_file = self.civitai_vae_file
 		if vae_file is None: return None
 
-		# Search for installed model with matching hash
-		for model in self.installed_by_version:
-			if model.hash == vae_file.hash:
-				return model
-		return None
+		# Look up installed model with matching hash
+		models = self.by_hash_index().get(vae_file.hash, [])
+		return models[0] if models else None
 
 	@property
 	def included_by(self) -> list['Model']:
@@ -427,10 +666,11 @@ class Model:
 
 		# Search for installed models with matching VAE hash
 		models: list[Model] = []
-		for model in self.all():
-			vae_file = model.civitai_vae_file
-			if vae_file is not None and vae_file.hash == self.hash:
-				models.append(model)
+		for bucket in self.by_hash_index().values():
+			for model in bucket:
+				vae_file = model.civitai_vae_file
+				if vae_file is not None and vae_file.hash == self.hash:
+					models.append(model)
 		return models
 
 	def scan(self, update= False):
@@ -452,31 +692,54 @@ class Model:
 		# Regenerate markdown for related models
 		self.regenerate_related()
 
+	def ensure_hash(self):
+		''' Compute and assign the model hash once, reusing the stored hash cache '''
+
+		if self.hash is not None:
+			return self.hash
+
+		# Models without a file hash to an empty string
+		file = sd_webui.model.file(self.type, self.filename)
+		if file is None:
+			self.hash = ''
+			return self.hash
+
+		# Reuse the stored hash while the file stats are unchanged
+		stat = file.stat()
+		hashes = utilities.load_json(paths.HASHES_FILE, {})
+		cached = hashes.get(self.key)
+		if cached is not None and cached['mtime'] == stat.st_mtime and cached['size'] == stat.st_size:
+			self.hash = cached['hash']
+			return self.hash
+
+		# Hash the file and store the result
+		self.hash = utilities.file_sha256(file)
+		hashes[self.key] = \
+		{
+			'mtime': stat.st_mtime,
+			'size': stat.st_size,
+			'hash': self.hash
+		}
+		utilities.store_json(paths.HASHES_FILE, hashes)
+		return self.hash
+
 	def scan_database(self):
 		''' Scan local Civitai database for model information '''
 
 		# Get model hash if not set
-		if self.hash is None:
-			self.hash = sd_webui.model.hash(self.type, self.filename)
-
-		# Try to find matching file hash
-		for json_file in list(paths.DATABASE_DIR.glob('*.json')):
-			model = civitai.Model.load_raw_json(json_file)
-			for version in model.versions:
-				for file in version.files:
+		self.ensure_hash()
 
-					# The scan is saved only if the hash matches
-					if file.hash == self.hash:
-						self.model_id = model.id
-						self.save_scan()
-						return
+		# The scan is saved only if a database model contains the hash
+		model_id = database_hash_index().get(self.hash)
+		if model_id is not None:
+			self.model_id = model_id
+			self.save_scan()
 
 	def scan_civitai(self):
 		''' Scan Civitai API for model information '''
 
 		# Get model hash if not set
-		if self.hash is None:
-			self.hash = sd_webui.model.hash(self.type, self.filename)
+		self.ensure_hash()
 
 		# Request model version if model ID is not set
 		if self.model_id is None:
@@ -493,6 +756,7 @@ class Model:
 
 		# Store Civitai database file
 		civitai_model.store_raw_json(self.json_file)
+		self.invalidate_civitai_cache()
 
 	def load_scan(self):
 		''' Load model scan from storage '''
@@ -512,8 +776,7 @@ class Model:
 		scans = load_scans()
 
 		# Get model hash
-		if self.hash is None:
-			self.hash = sd_webui.model.hash(self.type, self.filename)
+		self.ensure_hash()
 
 		# Set model ID and hash
 		scans[self.key] = \
@@ -524,8 +787,17 @@ class Model:
 
 		# Save updated scans and refresh cache
 		save_scans(scans)
+		self.invalidate_civitai_cache()
 		self.refresh_cache()
 
+	def invalidate_civitai_cache(self):
+		''' Drop memoized Civitai objects after a scan or database mutation '''
+
+		self._civitai_model = None
+		self._civitai_version = None
+		self._civitai_file = None
+		self._installed_buckets = None
+
 	def assert_vae_type(self):
 		''' Remove Civitai model ID for VAE models if there is a type mismatch '''
 
@@ -565,8 +837,17 @@ class Model:
 
 		# Create symlink to image
 		self.preview_file.symlink_to(image)
+		invalidate_images_index()
 		LOGGER.info(f'Set preview for model "{self.filename.full}"')
 
+	def preview_target_name(self):
+		''' Name of the image the preview symlink points to '''
+
+		try:
+			return Path(os.readlink(self.preview_file)).name
+		except OSError:
+			return self.preview_file.resolve().name
+
 	def image_by_index(self, index: Optional[int]= None):
 		'''
 			Retrieve a model image by its index
@@ -607,6 +888,7 @@ class Model:
 
 		# Convert image to PNG
 		utilities.image_to_png(paths.IMAGES_DIR, filename)
+		invalidate_images_index()
 
 		# Set image as preview if there is no preview
 		if not self.has_preview or replace_preview:
@@ -622,24 +904,33 @@ class Model:
 			if self.has_preview and image.samefile(self.preview_file):
 				self.preview_file.unlink()
 				image.unlink()
+				invalidate_images_index()
 				self.select_preview()
 			else:
 				image.unlink()
+				invalidate_images_index()
 
 	def image_file_entities(self):
 		''' Get all missing Civitai model images as entities for the download manager '''
 
-		files = []
+		# Pair each missing image with its corresponding Civitai image
+		pending: list[tuple[str, Filename]] = []
 		for image in self.missing_images:
-
-			# Get corresponding Civitai image
 			image_filename = Filename(image)
 			index = cast(int, image_filename.get_index())
 			civitai_image = self.civitai_version.images[index]
+			pending.append((civitai_image.custom_url, image_filename))
+
+		if len(pending) == 0:
+			return []
+
+		# Entity construction performs a blocking request, overlap them
+		def create_file(entry: tuple[str, Filename]):
+			return download.File(entry[0], self.type, entry[1])
 
-			# Generate file entity
-			files.append(download.File(civitai_image.custom_url, self.type, image_filename))
-		return files
+		workers = min(len(pending), download.CONCURRENT_DOWNLOADS)
+		with ThreadPoolExecutor(max_workers= workers) as executor:
+			return list(executor.map(create_file, pending))
 
 	def vae_file_entity(self):
 		''' Get the missing Civitai VAE model file as an entity for the download manager '''
@@ -678,6 +969,7 @@ class Model:
 			index = Filename(image).get_index()
 			image_filename = Filename(model.image_key + image.suffix)
 			image.rename(image.parent / image_filename.with_index(index).full)
+		invalidate_images_index()
 
 		# Set preview image to the first available image
 		model.select_preview()
@@ -733,6 +1025,7 @@ class Model:
 		self.rename_markdown(new_filename)
 		self.rename_vae_symlink(new_filename)
 		self.filename = new_filename
+		self.invalidate_civitai_cache()
 
 		# Regenerate markdown for models that include this model
 		self.regenerate_related()
@@ -770,16 +1063,22 @@ class Model:
 		if self.has_preview:
 			self.preview_file.unlink()
 
-		# Rename all model images
+		# Rename all model images, keeping track of the renamed preview image
+		preview_target: Optional[Path] = None
 		for image in self.all_images:
 			file = utilities.rename_file(image, new_name, indexed= True)
 			LOGGER.debug(f'Renamed image file to "{file.name}"')
-
-		# Set preview image to the renamed image
-		if index is not None:
-			model = Model(self.type, new_filename)
-			model.select_preview(index)
-			LOGGER.debug(f'Renamed preview image to "{model.preview_file.name}"')
+			if index is not None and Filename(file.name).get_index() == index:
+				preview_target = file
+		invalidate_images_index()
+
+		# Link the preview symlink directly to the renamed image
+		if preview_target is not None:
+			preview_file = paths.default_directory(self.type.name) / f'{new_filename.name}.preview.png'
+			if preview_file.exists() or preview_file.is_symlink():
+				preview_file.unlink()
+			preview_file.symlink_to(preview_target)
+			LOGGER.debug(f'Renamed preview image to "{preview_file.name}"')
 
 	def rename_markdown(self, new_filename: Filename):
 		''' Rename markdown file for the installed model '''
@@ -813,6 +1112,7 @@ class Model:
 		self.regenerate_related(False)
 
 		# Remove model from cache
+		self.invalidate_civitai_cache()
 		self.remove_cache()
 
 	def delete_model_file(self):
@@ -845,6 +1145,7 @@ class Model:
 		for image in self.all_images:
 			image.unlink()
 			LOGGER.debug(f'Deleted image file "{image.name}"')
+		invalidate_images_index()
 
 	def delete_markdown(self):
 		''' Delete markdown information file for the installed model '''
@@ -866,7 +1167,14 @@ class Model:
 			- Overwrites existing markdown file with current information
 		'''
 
-		self.markdown_file.write_text(self.build_markdown(), encoding= 'utf-8')
+		markdown = self.build_markdown()
+
+		# Skip the write when the stored markdown is already up to date
+		if self.has_markdown and self.markdown_file.read_text(encoding= 'utf-8') == markdown:
+			LOGGER.debug(f'Markdown file "{self.markdown_file.name}" is up to date')
+			return
+
+		self.markdown_file.write_text(markdown, encoding= 'utf-8')
 		LOGGER.info(f'Generated markdown file "{self.markdown_file.name}"')
 
 	def build_versions_markdown(self):
@@ -896,38 +1204,30 @@ class Model:
 	def build_markdown(self):
 		if not self.in_civitai:
 
-			# Get markdown template
-			markdown = paths.LOCAL_MD_FILE.read_text(encoding= 'utf-8')
-
-			# Fill model info
-			markdown = markdown.replace('{NAME}', self.name)
-
-			# Fill file info
-			markdown = markdown.replace('{LOCAL_FILE}', self.file.name)
-			markdown = markdown.replace('{AUTOV2}', self.autov2)
-			markdown = markdown.replace('{SIZE}', self.size_hr)
+			# Fill model and file info
+			markdown = fill_template(load_template(paths.LOCAL_MD_FILE),
+			{
+				'NAME':       self.name,
+				'LOCAL_FILE': self.file.name,
+				'AUTOV2':     self.autov2,
+				'SIZE':       self.size_hr
+			})
 
 		else:
 
-			# Get markdown template
-			markdown = paths.REMOTE_MD_FILE.read_text(encoding= 'utf-8')
-
-			# Fill model info
-			markdown = markdown.replace('{NAME}', self.civitai_model.name)
-			markdown = markdown.replace('{URL}', self.civitai_version.url)
-
-			# Fill tags
-			markdown = markdown.replace('{TAGS}', ', '.join([f'`{tag}`' for tag in self.tags]))
-
-			# Fill version info
-			markdown = markdown.replace('{VERSIONS}', self.build_versions_markdown())
-
-			# Fill file info
-			markdown = markdown.replace('{LOCAL_FILE}', self.file.name)
-			markdown = markdown.replace('{REMOTE_FILE}', self.civitai_file.name)
-			markdown = markdown.replace('{AUTOV2}', self.civitai_file.autov2)
-			markdown = markdown.replace('{TYPE}', self.civitai_file.type_hr)
-			markdown = markdown.replace('{SIZE}', self.civitai_file.size_hr)
+			# Fill model, tag, version and file info
+			markdown = fill_template(load_template(paths.REMOTE_MD_FILE),
+			{
+				'NAME':        self.civitai_model.name,
+				'URL':         self.civitai_version.url,
+				'TAGS':        ', '.join([f'`{tag}`' for tag in self.tags]),
+				'VERSIONS':    self.build_versions_markdown(),
+				'LOCAL_FILE':  self.file.name,
+				'REMOTE_FILE': self.civitai_file.name,
+				'AUTOV2':      self.civitai_file.autov2,
+				'TYPE':        self.civitai_file.type_hr,
+				'SIZE':        self.civitai_file.size_hr
+			})
 
 		# Generated fields
 		vae_local_file = self.vae_model.file.name if self.vae_model is not None else '`NOT INSTALLED`'
@@ -936,22 +1236,28 @@ class Model:
 
 		# Fill VAE info
 		if self.civitai_vae_file is not None:
-			markdown += paths.VAE_MD_FILE.read_text(encoding= 'utf-8')
-			markdown = markdown.replace('{VAE_LOCAL_FILE}', vae_local_file)
-			markdown = markdown.replace('{VAE_REMOTE_FILE}', self.civitai_vae_file.name)
-			markdown = markdown.replace('{VAE_AUTOV2}', self.civitai_vae_file.autov2)
+			markdown += fill_template(load_template(paths.VAE_MD_FILE),
+			{
+				'VAE_LOCAL_FILE':  vae_local_file,
+				'VAE_REMOTE_FILE': self.civitai_vae_file.name,
+				'VAE_AUTOV2':      self.civitai_vae_file.autov2
+			})
 
 		# Fill included by
 		if included_by_md != '':
-			markdown += paths.LIST_MD_FILE.read_text(encoding= 'utf-8')
-			markdown = markdown.replace('{LIST_TITLE}', 'Included by')
-			markdown = markdown.replace('{LIST_CONTENT}', included_by_md)
+			markdown += fill_template(load_template(paths.LIST_MD_FILE),
+			{
+				'LIST_TITLE':   'Included by',
+				'LIST_CONTENT': included_by_md
+			})
 
 		# Fill trigger words
 		if trigger_words_md != '':
-			markdown += paths.LIST_MD_FILE.read_text(encoding= 'utf-8')
-			markdown = markdown.replace('{LIST_TITLE}', 'Trigger words')
-			markdown = markdown.replace('{LIST_CONTENT}', trigger_words_md)
+			markdown += fill_template(load_template(paths.LIST_MD_FILE),
+			{
+				'LIST_TITLE':   'Trigger words',
+				'LIST_CONTENT': trigger_words_md
+			})
 
 		return markdown
 
@@ -971,21 +1277,23 @@ class Model:
 		autov2 = self.autov2
 		size = self.size_hr
 		status = 'Not Scanned'
-		tags = ','.join(self.tags)
-
-		# Version
-		if self.in_civitai:
-			version = self.civitai_version.full_name
+		tags = ''
 
 		# Status
 		if self.has_scan:
 			status = 'Scanned'
+
+		# The Civitai columns are only computed for models known to Civitai
 		if self.in_civitai:
+			version = self.civitai_version.full_name
+			tags = ','.join(self.tags)
+
 			status = 'Latest'
-		if self.is_updatable:
-			status = 'Outdated'
-		elif not self.is_latest:
-			status = 'Previous'
+			if self.is_updatable:
+				status = 'Outdated'
+			elif not self.is_latest:
+				status = 'Previous'
+
 		if len(self.included_by) > 0:
 			status += ' I'
 		elif self.civitai_vae_file is not None:
@@ -1,6 +1,9 @@
 import sys
+import queue
+import atexit
 import logging
 from enum import Enum
+from logging.handlers import QueueHandler, QueueListener, MemoryHandler
 
 # Library
 from library.settings import Settings
@@ -9,7 +12,14 @@ from library.settings import EXTENSION_NAME
 
 # Logger state
 LOGGER_INITIALIZED = False
-FILE_HANDLER: logging.FileHandler | None = None
+FILE_HANDLER: MemoryHandler | None = None
+
+# File log buffering
+FILE_BUFFER_CAPACITY = 512
+
+# Log records are queued and handled on a background listener thread
+LOG_QUEUE: queue.SimpleQueue = queue.SimpleQueue()
+LISTENER: QueueListener | None = None
 
 # Logging formats
 DATE_FORMAT     = '%d/%m/%Y %H:%M:%S'
@@ -29,29 +39,57 @@ class TerminalColor(Enum):
 	def wrap(self, text: str):
 		return self.value + text + TerminalColor.RESET.value
 
+# Per-level console formatters, built once at module load
+CONSOLE_FORMATTERS = \
+{
+	logging.DEBUG:    logging.Formatter(TerminalColor.GREY.wrap(TERMINAL_FORMAT)),
+	logging.INFO:     logging.Formatter(TerminalColor.BLUE.wrap(TERMINAL_FORMAT)),
+	logging.WARNING:  logging.Formatter(TerminalColor.YELLOW.wrap(TERMINAL_FORMAT)),
+	logging.ERROR:    logging.Formatter(TerminalColor.RED.wrap(TERMINAL_FORMAT)),
+	logging.CRITICAL: logging.Formatter(TerminalColor.BOLD_RED.wrap(TERMINAL_FORMAT))
+}
+DEFAULT_CONSOLE_FORMATTER = logging.Formatter(TERMINAL_FORMAT)
+
 class ConsoleFormatter(logging.Formatter):
 	''' Allows console logs to be formatted with colors '''
 
-	def __init__(self, format: str):
-		super().__init__()
-		self.fmt = format
-		self.formats = \
-		{
-			logging.DEBUG:    TerminalColor.GREY.wrap(self.fmt),
-			logging.INFO:     TerminalColor.BLUE.wrap(self.fmt),
-			logging.WARNING:  TerminalColor.YELLOW.wrap(self.fmt),
-			logging.ERROR:    TerminalColor.RED.wrap(self.fmt),
-			logging.CRITICAL: TerminalColor.BOLD_RED.wrap(self.fmt)
-		}
-
 	def format(self, record: logging.LogRecord):
-		format = self.formats.get(record.levelno)
-		formatter = logging.Formatter(format)
+		formatter = CONSOLE_FORMATTERS.get(record.levelno, DEFAULT_CONSOLE_FORMATTER)
 		return formatter.format(record)
 
+# Console handler shared by every listener
+STDOUT_HANDLER = logging.StreamHandler(sys.stdout)
+STDOUT_HANDLER.setFormatter(ConsoleFormatter())
+
+def restart_listener():
+	''' Start the background listener that owns the real handlers '''
+	global LISTENER
+
+	if LISTENER is not None:
+		LISTENER.stop()
+
+	handlers = [STDOUT_HANDLER] if FILE_HANDLER is None else [STDOUT_HANDLER, FILE_HANDLER]
+	LISTENER = QueueListener(LOG_QUEUE, *handlers, respect_handler_level= True)
+	LISTENER.start()
+
+def stop_listener():
+	''' Flush and stop the background listener on shutdown '''
+	global LISTENER
+
+	if LISTENER is not None:
+		LISTENER.stop()
+		LISTENER = None
+
+	# Flush any buffered file records
+	if FILE_HANDLER is not None:
+		FILE_HANDLER.flush()
+
+atexit.register(stop_listener)
+
 def configure():
 	'''
 		Configures the logs to redirect them to the standard output and to a file
+		- Handlers run on a background listener thread so log calls never block
 		- Returns the logger instance
 	'''
 	global LOGGER_INITIALIZED, FILE_HANDLER
@@ -62,27 +100,40 @@ def configure():
 	# The logger level is set
 	logger.setLevel(logging.DEBUG if Settings.debug_mode() else logging.INFO)
 
+	# Track whether the listener handlers changed
+	handlers_changed = False
+
 	if Settings.debug_mode():
 		if FILE_HANDLER is None:
 
 			# Logs are redirected to a file if the debug mode is enabled
-			FILE_HANDLER = logging.FileHandler(LOGGER_FILE)
-			FILE_HANDLER.setFormatter(logging.Formatter(FILE_FORMAT, DATE_FORMAT))
-			logger.addHandler(FILE_HANDLER)
+			# Writes are buffered and flushed on warnings, capacity or shutdown
+			file_handler = logging.FileHandler(LOGGER_FILE)
+			file_handler.setFormatter(logging.Formatter(FILE_FORMAT, DATE_FORMAT))
+			FILE_HANDLER = MemoryHandler \
+			(
+				capacity= FILE_BUFFER_CAPACITY,
+				flushLevel= logging.WARNING,
+				target= file_handler,
+				flushOnClose= True
+			)
+			handlers_changed = True
 	elif FILE_HANDLER is not None:
 
 			# The file handler is removed if it exists
-			logger.removeHandler(FILE_HANDLER)
+			FILE_HANDLER.close()
 			FILE_HANDLER = None
+			handlers_changed = True
 
 	# The logger is returned if it has already been initialized
 	if LOGGER_INITIALIZED:
+		if handlers_changed:
+			restart_listener()
 		return logger
 
-	# Logs are redirected to the standard output
-	stdout_handler = logging.StreamHandler(sys.stdout)
-	stdout_handler.setFormatter(ConsoleFormatter(TERMINAL_FORMAT))
-	logger.addHandler(stdout_handler)
+	# Log records are queued and handled by the listener
+	logger.addHandler(QueueHandler(LOG_QUEUE))
+	restart_listener()
 
 	# Disable the propagation of logs to the parent logger
 	logger.propagate = False
@@ -4,16 +4,18 @@ from pathlib import Path
 from modules import shared
 import modules.scripts as scripts
 
-# Directories
-ROOT_DIR      = Path.cwd()
-EXTENSION_DIR = Path(scripts.basedir())
+# Directories, canonicalized once so downstream joins stay canonical
+ROOT_DIR      = Path.cwd().resolve(strict= False)
+EXTENSION_DIR = Path(scripts.basedir()).resolve(strict= False)
 IMAGES_DIR    = EXTENSION_DIR / 'images'
+CACHE_DIR     = EXTENSION_DIR / 'cache'
 DATABASE_DIR  = EXTENSION_DIR / 'database'
 TEMPLATES_DIR = EXTENSION_DIR / 'templates'
 
 # Files
 LOGGER_FILE    = EXTENSION_DIR / 'extension.log'
 SCANNED_FILE   = EXTENSION_DIR / 'scanned.json'
+HASHES_FILE    = EXTENSION_DIR / 'hashes.json'
 LOCAL_MD_FILE  = TEMPLATES_DIR / 'local.md'
 REMOTE_MD_FILE = TEMPLATES_DIR / 'remote.md'
 VAE_MD_FILE    = TEMPLATES_DIR / 'vae.md'
@@ -35,43 +37,45 @@ CMD_LORA_DIR         = 'lora_dir'
 CMD_LYCORIS_DIR      = 'lyco_dir'
 CMD_VAE_DIR          = 'vae_dir'
 
+# Default directories by model type name
+DEFAULT_DIRS = \
+{
+	'CHECKPOINT':   CHECKPOINT_DIR,
+	'EMBEDDING':    EMBEDDING_DIR,
+	'HYPERNETWORK': HYPERNETWORK_DIR,
+	'LORA':         LORA_DIR,
+	'LYCORIS':      LYCORIS_DIR,
+	'VAE':          VAE_DIR
+}
+
+# Command line directory options by model type name
+CMD_DIRS = \
+{
+	'CHECKPOINT':   CMD_CHECKPOINT_DIR,
+	'EMBEDDING':    CMD_EMBEDDING_DIR,
+	'HYPERNETWORK': CMD_HYPERNETWORK_DIR,
+	'LORA':         CMD_LORA_DIR,
+	'LYCORIS':      CMD_LYCORIS_DIR,
+	'VAE':          CMD_VAE_DIR
+}
+
 def default_directory(type_name: str):
 	''' Get the default directory for the given model type name '''
 
-	if type_name == 'CHECKPOINT':
-		return CHECKPOINT_DIR
-	if type_name == 'EMBEDDING':
-		return EMBEDDING_DIR
-	if type_name == 'HYPERNETWORK':
-		return HYPERNETWORK_DIR
-	if type_name == 'LORA':
-		return LORA_DIR
-	if type_name == 'LYCORIS':
-		return LYCORIS_DIR
-	if type_name == 'VAE':
-		return VAE_DIR
-	raise ValueError(f'Invalid model type: {type_name}')
+	try:
+		return DEFAULT_DIRS[type_name]
+	except KeyError:
+		raise ValueError(f'Invalid model type: {type_name}')
 
 def custom_directory(type_name: str):
 	''' Get the directory specified by the command line option for the given model type name '''
 
-	def get_path(name: str):
-		''' Get the path of the command line option with the given name '''
-		if hasattr(shared.opts, name):
-			option = getattr(shared.opts, name)
-			return Path(option) if option is not None else None
-		return None
+	try:
+		option_name = CMD_DIRS[type_name]
+	except KeyError:
+		raise ValueError(f'Invalid model type: {type_name}')
 
-	if type_name == 'CHECKPOINT':
-		return get_path(CMD_CHECKPOINT_DIR)
-	if type_name == 'EMBEDDING':
-		return get_path(CMD_EMBEDDING_DIR)
-	if type_name == 'HYPERNETWORK':
-		return get_path(CMD_HYPERNETWORK_DIR)
-	if type_name == 'LORA':
-		return get_path(CMD_LORA_DIR)
-	if type_name == 'LYCORIS':
-		return get_path(CMD_LYCORIS_DIR)
-	if type_name == 'VAE':
-		return get_path(CMD_VAE_DIR)
-	raise ValueError(f'Invalid model type: {type_name}')
\ No newline at end of file
+	if hasattr(shared.opts, option_name):
+		option = getattr(shared.opts, option_name)
+		return Path(option) if option is not None else None
+	return None
\ No newline at end of file
@@ -1,7 +1,9 @@
+import os
 import sys
 import importlib
 import importlib.util
 from enum import Enum
+from pathlib import Path
 from typing import Optional, Any, cast
 
 # SD Webui Modules
@@ -22,6 +24,22 @@ LOGGER = logger.configure()
 BUILTIN_LORA_EXTENSION: Optional['extension.lora_builtin'] = None
 LYCORIS_EXTENSION:      Optional['extension.lycoris']      = None
 
+# Extension imports are attempted at most once per process
+LORA_IMPORT_ATTEMPTED    = False
+LYCORIS_IMPORT_ATTEMPTED = False
+
+# Lowercase filename index per model type
+FILENAME_INDEX: dict['civitai.Model.Type', dict[str, Filename]] = {}
+
+# Cached filename list per model type
+FILENAMES_CACHE: dict['civitai.Model.Type', list[Filename]] = {}
+
+# Cached directory list per model type, guarded by the custom directory option
+DIRECTORY_CACHE: dict['civitai.Model.Type', tuple[Optional[Path], list[Path]]] = {}
+
+# Directory list and latest modification time seen by the last reload per model type
+LAST_RELOAD: dict['civitai.Model.Type', tuple[tuple[Path, ...], int]] = {}
+
 class extension:
 	''' Interface for the SD web UI extensions '''
 
@@ -30,7 +48,10 @@ class extension:
 
 		@staticmethod
 		def import_extension():
-			global BUILTIN_LORA_EXTENSION
+			global BUILTIN_LORA_EXTENSION, LORA_IMPORT_ATTEMPTED
+			if LORA_IMPORT_ATTEMPTED:
+				return BUILTIN_LORA_EXTENSION
+			LORA_IMPORT_ATTEMPTED = True
 			try:
 				sys.path.append(str(paths.ROOT_DIR / 'extensions-builtin' / 'Lora'))
 				builtin_lora_extension = importlib.import_module('extensions-builtin.Lora.lora')
@@ -73,7 +94,10 @@ class extension:
 
 		@staticmethod
 		def import_extension():
-			global LYCORIS_EXTENSION
+			global LYCORIS_EXTENSION, LYCORIS_IMPORT_ATTEMPTED
+			if LYCORIS_IMPORT_ATTEMPTED:
+				return LYCORIS_EXTENSION
+			LYCORIS_IMPORT_ATTEMPTED = True
 			try:
 				lycoris_extension = importlib.import_module('extensions.a1111-sd-webui-lycoris.lycoris')
 				LYCORIS_EXTENSION = cast(extension.lycoris, lycoris_extension)
@@ -113,14 +137,54 @@ class model:
 		def list(type: civitai.Model.Type):
 			''' List the directories of the given model type '''
 
-			default_directory = paths.default_directory(type.name)
+			# Reuse the cached list while the custom directory option is unchanged
 			custom_directory = paths.custom_directory(type.name)
-			return utilities.get_directories([default_directory, custom_directory])
+			cached = DIRECTORY_CACHE.get(type)
+			if cached is not None and cached[0] == custom_directory:
+				return cached[1]
+
+			default_directory = paths.default_directory(type.name)
+			directories = utilities.get_directories([default_directory, custom_directory])
+			DIRECTORY_CACHE[type] = (custom_directory, directories)
+			return directories
+
+		@staticmethod
+		def latest_mtime(type: civitai.Model.Type) -> int:
+			''' Latest modification time in nanoseconds over the directories of the given model type '''
+
+			latest = 0
+			for directory in model.directory.list(type):
+				try:
+					latest = max(latest, directory.stat().st_mtime_ns)
+					with os.scandir(directory) as entries:
+						for entry in entries:
+							latest = max(latest, entry.stat(follow_symlinks= False).st_mtime_ns)
+				except OSError:
+					continue
+			return latest
+
+	@staticmethod
+	def filename_index(type: civitai.Model.Type) -> dict[str, Filename]:
+		''' Map of lowercase full filenames to installed model filenames '''
+
+		if type not in FILENAME_INDEX:
+			FILENAME_INDEX[type] = {filename.full.lower(): filename for filename in model.filenames(type)}
+		return FILENAME_INDEX[type]
 
 	@staticmethod
 	def reload_filenames(type: civitai.Model.Type):
 		''' Reload the list of filenames for the given model type '''
 
+		# Skip the reload when the directories are unchanged since the last one
+		state = (tuple(model.directory.list(type)), model.directory.latest_mtime(type))
+		if LAST_RELOAD.get(type) == state:
+			return
+		LAST_RELOAD[type] = state
+
+		FILENAME_INDEX.pop(type, None)
+		FILENAMES_CACHE.pop(type, None)
+		DIRECTORY_CACHE.pop(type, None)
+
 		if type == civitai.Model.Type.CHECKPOINT:
 			sd_models.list_models()
 			LOGGER.debug(f'Checkpoint filenames reloaded')
@@ -161,6 +225,10 @@ class model:
 	def filenames(type: civitai.Model.Type) -> list[Filename]:
 		''' List the installed model filenames for the given model type '''
 
+		# Serve the cached list until the type is reloaded
+		if type in FILENAMES_CACHE:
+			return FILENAMES_CACHE[type]
+
 		if type == civitai.Model.Type.CHECKPOINT:
 			checkpoints: dict[str, sd_models.CheckpointInfo] = sd_models.checkpoints_list
 			filenames = [Filename(value.name) for value in checkpoints.values()]
@@ -189,8 +257,10 @@ class model:
 		else:
 			raise ValueError(f'Unknown model type: {type}')
 
-		# Remove non-existent files from the list
-		return [filename for filename in filenames if model.file(type, filename) is not None]
+		# Remove non-existent files from the list with one scan per directory
+		index = utilities.directory_index(model.directory.list(type))
+		FILENAMES_CACHE[type] = [filename for filename in filenames if filename.full in index]
+		return FILENAMES_CACHE[type]
 
 	@staticmethod
 	def names(type: civitai.Model.Type) -> list[str]:
@@ -222,7 +292,10 @@ class model:
 
 	@staticmethod
 	def hash(type: civitai.Model.Type, filename: Filename):
-		''' Gets the hash of a model '''
+		'''
+			Gets the hash of a model
+			- Hashes the file eagerly, prefer `local.Model.ensure_hash` for deferred hashing
+		'''
 
 		file = utilities.find_file(model.directory.list(type), filename)
 		return utilities.file_sha256(file) if file is not None else ''
\ No newline at end of file
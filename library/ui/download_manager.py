@@ -1,4 +1,3 @@
-import time
 import gradio as gr
 
 # Extension Library
@@ -14,9 +13,14 @@ def stop_state():
 	return 'Stop Download' if MANAGER.running else 'Close Manager'
 
 def run_start_download():
+	last_revision = -1
 	while MANAGER.running:
-		yield html_blocks.create_manager(MANAGER.files), stop_state()
-		time.sleep(0.2)
+
+		# Re-render only when the download state changed
+		if MANAGER.revision != last_revision:
+			last_revision = MANAGER.revision
+			yield html_blocks.create_manager(MANAGER.files), stop_state()
+		MANAGER.wait_change(timeout= 1.0)
 	yield html_blocks.create_manager(MANAGER.files), stop_state()
 
 def run_stop_download():
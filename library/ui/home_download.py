@@ -1,4 +1,3 @@
-import time
 import gradio as gr
 from typing import Optional
 
@@ -55,37 +54,38 @@ def run_search_model(url_or_id: str):
 		select_file[3],
 	)
 
-def run_clear_search():
-	return \
-	(
-		# URL / ID
-		gr.update(value= ''),
+# Clearing the search always yields the same updates, so they are built once
+CLEAR_SEARCH_OUTPUTS = \
+(
+	# URL / ID
+	gr.update(value= ''),
 
-		# Model, Name, Type and Version
-		None,
-		gr.update(value= ''),
-		gr.update(value= ''),
-		gr.update(choices= [''], value= ''),
+	# Model, Name, Type and Version
+	None,
+	gr.update(value= ''),
+	gr.update(value= ''),
+	gr.update(choices= [''], value= ''),
 
-		# Download button
-		download_state()
-	)
+	# Download button
+	download_state()
+)
+
+def run_clear_search():
+	return CLEAR_SEARCH_OUTPUTS
 
 def run_select_file(version: civitai.Version | None, full_name: str):
 	file_downloaded = False
 
-	if version is not None:
-		file = next(f for f in version.files if f.full_name == full_name)
+	# Find the selected file in a single short-circuiting pass
+	file = next((f for f in version.files if f.full_name == full_name), None) if version is not None else None
+
+	if file is not None:
 		type = file.type_hr
 		size = file.size_hr
 
-		# Search for existing file
-		for model in local.Model.all():
-			if model.hash == file.hash:
-				file_downloaded = True
-				break
+		# Search for existing file through the installed hash index
+		file_downloaded = file.hash in local.Model.by_hash_index()
 	else:
-		file = None
 		type = ''
 		size = ''
 
@@ -101,9 +101,17 @@ def run_select_file(version: civitai.Version | None, full_name: str):
 
 def run_select_version(model: civitai.Model | None, full_name: str):
 	if model is not None:
-		version = next(v for v in model.versions if v.full_name == full_name)
-		files = [file.full_name for file in version.files if not file.is_vae]
-		file = next(f.full_name for f in version.files if f.primary)
+		version = next((v for v in model.versions if v.full_name == full_name), None)
+		files = []
+		file = ''
+
+		# Collect the selectable files and the primary file in one pass
+		if version is not None:
+			for version_file in version.files:
+				if not version_file.is_vae:
+					files.append(version_file.full_name)
+				if version_file.primary and file == '':
+					file = version_file.full_name
 	else:
 		version = None
 		files = []
@@ -142,10 +150,10 @@ def run_download_file(model: civitai.Model, version: civitai.Version, file: civi
 	# Start the download manager
 	download_manager.start()
 
-	# Disable download button and yield 'Downloading...' until download is complete
+	# Disable download button and wait until download is complete
+	yield download_state(text= 'Downloading...')
 	while download_manager.running:
-		yield download_state(text= 'Downloading...')
-		time.sleep(0.2)
+		download_manager.wait_change(timeout= 1.0)
 
 	# Remove image entities if main download is not complete
 	if not model_entity.complete:
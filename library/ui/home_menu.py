@@ -1,6 +1,8 @@
+import os
 import time
 import gradio as gr
-from typing	import Optional
+from typing	import NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # SD Webui Modules
 from modules import ui
@@ -17,6 +19,81 @@ from library.settings import Settings
 # Logger
 LOGGER = logger.configure()
 
+# Model type by human readable name, built once at import
+TYPE_BY_NAME_HR = {type.name_hr: type for type in civitai.Model.Type}
+
+# Per-type status counts cache
+STATUS_CACHE: dict[civitai.Model.Type, tuple[tuple[int, int, int], 'StatusCounts']] = {}
+STATUS_GENERATION = 0
+
+class StatusCounts(NamedTuple):
+	''' Status counts of a set of models, gathered in a single pass '''
+
+	missing_scan:        int
+	nsfw_previews:       int
+	missing_previews:    int
+	missing_vae_symlinks: int
+	extra_vae_symlinks:  int
+	missing_markdown:    int
+	missing_images:      int
+	missing_vaes:        int
+
+def invalidate_status_counts():
+	''' Drop the cached status counts after a model mutation '''
+	global STATUS_GENERATION
+	STATUS_GENERATION += 1
+
+def status_counts(type: civitai.Model.Type) -> StatusCounts:
+	''' Status counts of the given model type, computed in one pass over its models '''
+
+	# Reuse the cached counts until a mutation changes any generation
+	generation = (STATUS_GENERATION, local.MODEL_HASH_GENERATION, local.IMAGES_GENERATION)
+	cached = STATUS_CACHE.get(type)
+	if cached is not None and cached[0] == generation:
+		return cached[1]
+
+	missing_scan = 0
+	nsfw_previews = 0
+	missing_previews = 0
+	missing_vae_symlinks = 0
+	extra_vae_symlinks = 0
+	missing_markdown = 0
+	missing_images = 0
+	missing_vaes = 0
+
+	# Read each model once and update every counter
+	for model in local.Model.by_type(type):
+		has_vae_symlink = model.has_vae_symlink
+		if not model.has_scan: missing_scan += 1
+		if model.has_nsfw_preview: nsfw_previews += 1
+		if model.has_missing_preview: missing_previews += 1
+		if model.vae_model is not None and not has_vae_symlink: missing_vae_symlinks += 1
+		if has_vae_symlink: extra_vae_symlinks += 1
+		if not model.has_markdown: missing_markdown += 1
+		if model.vae_missing: missing_vaes += 1
+		missing_images += len(model.missing_images)
+
+	counts = StatusCounts \
+	(
+		missing_scan, nsfw_previews, missing_previews, missing_vae_symlinks,
+		extra_vae_symlinks, missing_markdown, missing_images, missing_vaes
+	)
+	STATUS_CACHE[type] = (generation, counts)
+	return counts
+
+def counts_for(types: Optional[list[str]]= None) -> StatusCounts:
+	''' Sum of the cached status counts over the specified model types '''
+
+	# Default to all types
+	if types is None:
+		types = [type.name_hr for type in civitai.Model.Type]
+
+	totals = StatusCounts(0, 0, 0, 0, 0, 0, 0, 0)
+	for type_hr in types:
+		type = TYPE_BY_NAME_HR[type_hr]
+		totals = StatusCounts(*(a + b for a, b in zip(totals, status_counts(type))))
+	return totals
+
 def model_list(types: Optional[list[str]]= None):
 	''' Returns a list of models of the specified types '''
 
@@ -27,17 +104,15 @@ def model_list(types: Optional[list[str]]= None):
 	# Get the models
 	models: list[local.Model] = []
 	for type_hr in types:
-		type = civitai.Model.Type[type_hr.upper()]
+		type = TYPE_BY_NAME_HR[type_hr]
 		models.extend(local.Model.by_type(type))
 	return models
 
 def scan_status(types: Optional[list[str]]= None):
-	missing_scan = 0
+	return scan_update(counts_for(types), types)
 
-	# Count models with missing scan
-	for model in model_list(types):
-		if not model.has_scan:
-			missing_scan += 1
+def scan_update(counts: StatusCounts, types: Optional[list[str]]= None):
+	missing_scan = counts.missing_scan
 
 	# Generate Scan text
 	text = 'Scan 1 Model' if missing_scan == 1 else f'Scan {missing_scan} Models'
@@ -46,40 +121,35 @@ def scan_status(types: Optional[list[str]]= None):
 	return gr.update(interactive= types is None or len(types) > 0, value= text, variant= color)
 
 def nsfw_previews_status(types: Optional[list[str]]= None):
-	nsfw_previews = 0
+	return nsfw_previews_update(counts_for(types))
 
-	# Count the NSFW previews
-	for model in model_list(types):
-		if model.has_nsfw_preview:
-			nsfw_previews += 1
+def nsfw_previews_update(counts: StatusCounts):
+	nsfw_previews = counts.nsfw_previews
 
 	# Remove NSFW Previews text
 	text = 'Remove 1 NSFW Preview' if nsfw_previews == 1 else f'Remove {nsfw_previews} NSFW Previews'
 	return gr.update(interactive= True, visible= nsfw_previews > 0, value= text if nsfw_previews > 0 else 'IDLE')
 
 def missing_previews_status(types: Optional[list[str]]= None):
-	missing_previews = 0
+	return missing_previews_update(counts_for(types))
 
-	# Count the missing previews
-	for model in model_list(types):
-		if model.has_missing_preview:
-			missing_previews += 1
+def missing_previews_update(counts: StatusCounts):
+	missing_previews = counts.missing_previews
 
 	# Remove NSFW Previews text
 	text = 'Fix 1 Missing Preview' if missing_previews == 1 else f'Fix {missing_previews} Missing Previews'
 	return gr.update(interactive= True, visible= missing_previews > 0, value= text if missing_previews > 0 else 'IDLE')
 
 def vae_symlinks_status(types: Optional[list[str]]= None):
-	count = 0
+	return vae_symlinks_update(counts_for(types))
 
-	# Count the symlinks
-	for model in model_list(types):
-		if Settings.create_vae_symlinks():
-			if model.vae_model is not None and not model.has_vae_symlink:
-				count += 1
-		else:
-			if model.has_vae_symlink:
-				count += 1
+def vae_symlinks_update(counts: StatusCounts):
+
+	# Count the missing or removable symlinks
+	if Settings.create_vae_symlinks():
+		count = counts.missing_vae_symlinks
+	else:
+		count = counts.extra_vae_symlinks
 
 	# Fix VAE Symlinks text
 	if Settings.create_vae_symlinks():
@@ -89,12 +159,10 @@ def vae_symlinks_status(types: Optional[list[str]]= None):
 	return gr.update(visible= count > 0, value= text)
 
 def markdown_status(types: Optional[list[str]]= None):
-	missing_markdown = 0
+	return markdown_update(counts_for(types), types)
 
-	# Count models with missing markdown
-	for model in model_list(types):
-		if not model.has_markdown:
-			missing_markdown += 1
+def markdown_update(counts: StatusCounts, types: Optional[list[str]]= None):
+	missing_markdown = counts.missing_markdown
 
 	# Generate Markdown text
 	text = 'Generate 1 Missing Markdown File' if missing_markdown == 1 else f'Generate {missing_markdown} Missing Markdown Files'
@@ -102,106 +170,157 @@ def markdown_status(types: Optional[list[str]]= None):
 	return gr.update(interactive= types is None or len(types) > 0, value= text)
 
 def download_images_status(types: Optional[list[str]]= None):
-	missing_images = 0
+	return download_images_update(counts_for(types))
 
-	# Count the missing images
-	for model in model_list(types):
-		missing_images += len(model.missing_images)
+def download_images_update(counts: StatusCounts):
+	missing_images = counts.missing_images
 
 	# Download Images text
 	text = 'Download 1 Missing Image' if missing_images == 1 else f'Download {missing_images} Missing Images'
 	return gr.update(interactive= True, visible= missing_images > 0, value= text)
 
 def download_vaes_status(types: Optional[list[str]]= None):
-	missing_vaes = 0
+	return download_vaes_update(counts_for(types))
+
+def download_vaes_update(counts: StatusCounts):
 
 	# Cannot download VAEs if there is any model with missing scan
-	for model in model_list(types):
-		if not model.has_scan:
-			return gr.update(visible= False)
+	if counts.missing_scan > 0:
+		return gr.update(visible= False)
 
 	# Count the missing vaes
-	for model in model_list(types):
-		if model.vae_missing:
-			missing_vaes += 1
+	missing_vaes = counts.missing_vaes
 
 	# Download VAEs text
 	text = 'Download 1 Missing VAE' if missing_vaes == 1 else f'Download {missing_vaes} Missing VAEs'
 	return gr.update(interactive= True, visible= missing_vaes > 0, value= text)
 
 def run_scan(types: list[str], scan_text: str):
+	update = 'Update' in scan_text
+	last_yield = 0.0
+
+	# Hash the pending models concurrently before the sequential scans
+	pending = [model for model in model_list(types) if update or not model.has_scan]
+	if len(pending) > 0:
+		yield \
+		(
+			gr.update(interactive= False, value= 'Hashing models...'),
+			*run_model_type_change(types)[1:]
+		)
+		local.prehash(pending)
 
 	# Scan or update the model scans
-	for model in model_list(types):
-		if 'Update' not in scan_text:
-			if not model.has_scan:
-				yield \
-				(
-					gr.update(interactive= False, value= f'Scanning model {model.name}...'),
-					*run_model_type_change(types)[1:]
-				)
-				model.scan()
-		else:
+	for model in pending:
+		invalidate_status_counts()
+
+		# Progress updates are throttled to limit the UI syncs
+		now = time.monotonic()
+		if now - last_yield > 0.1:
+			last_yield = now
+			action = 'Updating scan for' if update else 'Scanning model'
 			yield \
 			(
-				gr.update(interactive= False, value= f'Updating scan for {model.name}...'),
+				gr.update(interactive= False, value= f'{action} {model.name}...'),
 				*run_model_type_change(types)[1:]
 			)
-			model.scan(True)
+		model.scan(update)
 
+	invalidate_status_counts()
 	yield run_model_type_change(types)
 
 def run_model_type_change(types: list[str]):
+
+	# Tally the counts once and build every button update from them
+	counts = counts_for(types)
 	return \
 	(
-		scan_status(types),
-		nsfw_previews_status(types),
-		missing_previews_status(types),
-		vae_symlinks_status(types),
-		markdown_status(types),
-		download_images_status(types),
-		download_vaes_status(types)
+		scan_update(counts, types),
+		nsfw_previews_update(counts),
+		missing_previews_update(counts),
+		vae_symlinks_update(counts),
+		markdown_update(counts, types),
+		download_images_update(counts),
+		download_vaes_update(counts)
 	)
 
 def run_refresh(types: list[str]):
 	local.clear_cache()
 	utilities.clear_json_cache()
 	sd_webui.model.reload_all_filenames()
+	invalidate_status_counts()
 	return run_model_type_change(types)
 
 def run_remove_nsfw_previews(types: list[str]):
-	models = model_list(types)
-	for model in models:
+	last_yield = 0.0
+	for model in model_list(types):
 		if model.has_nsfw_preview:
-			yield gr.update(interactive= False, value= f'Removing NSFW Preview for {model.name}...')
+
+			# Progress updates are throttled to limit the UI syncs
+			now = time.monotonic()
+			if now - last_yield > 0.1:
+				last_yield = now
+				yield gr.update(interactive= False, value= f'Removing NSFW Preview for {model.name}...')
 			model.preview_file.unlink()
 			model.select_preview()
+	invalidate_status_counts()
 	yield nsfw_previews_status(types)
 
 def run_fix_missing_previews(types: list[str]):
+	last_yield = 0.0
 	for model in model_list(types):
 		if model.has_missing_preview:
-			yield gr.update(interactive= False, value= f'Fixing Missing Preview for {model.name}...')
+
+			# Progress updates are throttled to limit the UI syncs
+			now = time.monotonic()
+			if now - last_yield > 0.1:
+				last_yield = now
+				yield gr.update(interactive= False, value= f'Fixing Missing Preview for {model.name}...')
 			model.select_preview()
+	invalidate_status_counts()
 	yield missing_previews_status(types)
 
 def run_fix_vae_symlinks(types: list[str]):
+	last_yield = 0.0
 	for model in model_list(types):
 		if Settings.create_vae_symlinks():
 			if model.vae_model is not None and not model.has_vae_symlink:
-				yield gr.update(interactive= False, value= f'Creating VAE Symlink for {model.name}...')
+
+				# Progress updates are throttled to limit the UI syncs
+				now = time.monotonic()
+				if now - last_yield > 0.1:
+					last_yield = now
+					yield gr.update(interactive= False, value= f'Creating VAE Symlink for {model.name}...')
 				model.link_vae()
 		else:
 			if model.has_vae_symlink:
-				yield gr.update(interactive= False, value= f'Removing VAE Symlink for {model.name}...')
+
+				# Progress updates are throttled to limit the UI syncs
+				now = time.monotonic()
+				if now - last_yield > 0.1:
+					last_yield = now
+					yield gr.update(interactive= False, value= f'Removing VAE Symlink for {model.name}...')
 				model.vae_symlink_file.unlink()
+	invalidate_status_counts()
 	yield vae_symlinks_status(types)
 
 def run_generate_markdown(types: list[str]):
 	models = model_list(types)
-	for index, model in enumerate(models):
-		yield gr.update(interactive= False, value= f'Generating Markdown {index + 1} / {len(models)}')
-		model.generate_markdown()
+
+	# Markdown generation is independent per model and dominated by file reads
+	workers = min(32, (os.cpu_count() or 1) * 4)
+	with ThreadPoolExecutor(max_workers= workers) as executor:
+		futures = [executor.submit(model.generate_markdown) for model in models]
+		last_yield = 0.0
+		for index, future in enumerate(as_completed(futures)):
+			future.result()
+
+			# Progress updates are throttled to limit the UI syncs
+			now = time.monotonic()
+			if now - last_yield > 0.1:
+				last_yield = now
+				yield gr.update(interactive= False, value= f'Generating Markdown {index + 1} / {len(models)}')
+
+	invalidate_status_counts()
 	yield markdown_status(types)
 
 def run_civitai_download_images(types: list[str]):
@@ -220,15 +339,16 @@ def run_civitai_download_images(types: list[str]):
 	# Start the download manager
 	download_manager.start()
 
-	# Wait for the download to finish
+	# Wait on manager changes instead of polling on a timer
+	yield gr.update(interactive= False, value= 'Downloading...')
 	while download_manager.running:
-		yield gr.update(interactive= False, value= 'Downloading...')
-		time.sleep(0.2)
+		download_manager.wait_change(timeout= 1.0)
 
 	# Fix missing previews
 	for model in model_list(types):
 		if model.has_missing_preview:
 			model.select_preview()
+	invalidate_status_counts()
 
 	# Yield final status
 	if download_manager.all_complete:
@@ -253,15 +373,16 @@ def run_civitai_download_vaes(types: list[str]):
 	# Start the download manager
 	download_manager.start()
 
-	# Wait for the download to finish
+	# Wait on manager changes instead of polling on a timer
+	yield gr.update(interactive= False, value= 'Downloading...')
 	while download_manager.running:
-		yield gr.update(interactive= False, value= 'Downloading...')
-		time.sleep(0.2)
+		download_manager.wait_change(timeout= 1.0)
 
 	# Handle the downloaded VAEs
 	for vae_entity in vae_entities:
 		if vae_entity.complete:
 			local.Model.handle_download(civitai.Model.Type.VAE, vae_entity.filename)
+	invalidate_status_counts()
 
 	# Yield final status
 	if download_manager.all_complete:
@@ -1,4 +1,4 @@
-import time
+import functools
 import urllib.parse
 from PIL import Image
 from typing	import cast
@@ -11,61 +11,81 @@ from library import download
 from library import utilities
 from library.utilities import Filename
 
+# Parameter info escape table, applied in one pass after collapsing \r\n
+INFO_ESCAPE_TABLE = str.maketrans({'"': '&quot;', "'": "\\'", '\r': '<br>', '\n': '<br>'})
+
+@functools.lru_cache(maxsize= 8192)
+def url_for_path(path: Path) -> str:
+	''' Escaped URL of a path relative to the SD web UI root '''
+	return urllib.parse.quote(str(path.relative_to(paths.ROOT_DIR)), safe= '/:\\')
+
 def create_image(model: local.Model, image_path: Path):
 	''' Creates HTML code for an image card with action buttons '''
 
+	# Compare the symlink target name instead of stating both files
+	is_preview = model.has_preview and model.preview_target_name() == image_path.name
+
+	# The rendered card is reused until the image file changes
+	mtime_ns = image_path.stat().st_mtime_ns
+	return render_image(image_path, mtime_ns, model.type.name, model.filename.full, is_preview)
+
+@functools.lru_cache(maxsize= 4096)
+def render_image(image_path: Path, mtime_ns: int, type: str, filename: str, is_preview: bool):
+	''' Renders the HTML code of an image card, cached per image file state '''
+
 	# Get image path relative to SD web UI root and escape special URL characters
-	relative_path = image_path.relative_to(paths.ROOT_DIR)
-	url_path = urllib.parse.quote(str(relative_path), safe= '/:\\')
+	url_path = url_for_path(image_path)
 
-	# Check if the image has parameters and if it is the preview
-	has_parameters = utilities.image_has_parameters(image_path)
-	is_preview = model.has_preview and image_path.samefile(model.preview_file)
+	# Read the PNG metadata once for the parameter check and extraction
+	with Image.open(image_path) as image:
+		info = image.info
+	has_parameters = 'parameters' in info
 
-	# Get model information and image index
-	type = model.type.name
-	filename = model.filename.full
+	# Get image index
 	index = cast(int, Filename(image_path).get_index())
 
 	# Add cache time to user defined images to avoid caching issues
-	cache_time = time.time() if index >= 1000 else 0
+	# The modification time busts the browser cache when the image changes
+	cache_time = mtime_ns if index >= 1000 else 0
 
-	# Create HTML code
-	html  = f'<div class="sd-mm-image">\n'
-	html += f'    <img src="file={url_path}?c={cache_time}" onclick="sdmmZoomImage(event)" />\n'
-	html += f'    <div class="sd-mm-actions">\n'
+	# Create HTML code without quadratic string concatenation
+	parts = \
+	[
+		f'<div class="sd-mm-image">\n',
+		f'    <img src="file={url_path}?c={cache_time}" onclick="sdmmZoomImage(event)" />\n',
+		f'    <div class="sd-mm-actions">\n'
+	]
 
 	# Preview icon
 	if is_preview:
-		html += f'    <div class="sd-mm-action sd-mm-preview" title="This is the preview"></div>\n'
+		parts.append(f'    <div class="sd-mm-action sd-mm-preview" title="This is the preview"></div>\n')
 
 	# Set as preview button
 	else:
-		html += f'    <div class="sd-mm-action sd-mm-star" title="Set as preview"\n'
-		html += f'        onclick="sdmmSetPreview(\'{type}\', \'{filename}\', {index})"></div>\n'
+		parts.append(f'    <div class="sd-mm-action sd-mm-star" title="Set as preview"\n')
+		parts.append(f'        onclick="sdmmSetPreview(\'{type}\', \'{filename}\', {index})"></div>\n')
 
 	if has_parameters:
-		info: str = Image.open(image_path).info['parameters']
+		parameters: str = info['parameters']
 
 		# Make info string safe for HTML
-		info = info.replace('"', '&quot;').replace("'", "\\'")
-		info = info.replace('\r\n', '<br>').replace('\r', '<br>').replace('\n', '<br>')
+		parameters = parameters.replace('\r\n', '\n').translate(INFO_ESCAPE_TABLE)
 
 		# Send to PNG Info button
-		html += f'    <div class="sd-mm-action sd-mm-send-to" title="Send to txt2img"\n'
-		html += f'        onclick="sdmmSendToTxt2Img(\'{type}\', \'{filename}\', {index})"></div>\n'
+		parts.append(f'    <div class="sd-mm-action sd-mm-send-to" title="Send to txt2img"\n')
+		parts.append(f'        onclick="sdmmSendToTxt2Img(\'{type}\', \'{filename}\', {index})"></div>\n')
 
 		# Show info button
-		html += f'    <div class="sd-mm-action sd-mm-info" title="Show info"\n'
-		html += f'        onclick="sdmmShowInfo(\'{info}\')"></div>\n'
+		parts.append(f'    <div class="sd-mm-action sd-mm-info" title="Show info"\n')
+		parts.append(f'        onclick="sdmmShowInfo(\'{parameters}\')"></div>\n')
 
 	# Delete image button
-	html += f'        <div class="sd-mm-action sd-mm-delete" title="Delete"\n'
-	html += f'            onclick="sdmmDeleteImage(\'{type}\', \'{filename}\', {index})"></div>\n'
+	parts.append(f'        <div class="sd-mm-action sd-mm-delete" title="Delete"\n')
+	parts.append(f'            onclick="sdmmDeleteImage(\'{type}\', \'{filename}\', {index})"></div>\n')
 
-	html += f'    </div>\n'
-	html += f'</div>\n'
-	return html
+	parts.append(f'    </div>\n')
+	parts.append(f'</div>\n')
+	return ''.join(parts)
 
 def create_gallery(model: local.Model):
 	''' Creates HTML code for a gallery of images '''
@@ -77,45 +97,60 @@ def create_gallery(model: local.Model):
 	if len(images) == 0:
 		return '<h3>Images</h3>\n'
 
-	# Create HTML for gallery
-	html  = f'<div class="sd-mm-gallery">\n'
-	html += f'	<div class="sd-mm-actions">\n'
-	html += f'		<div class="sd-mm-action sd-mm-add" title="Add Image"\n'
-	html += f'			onclick="sdmmTriggerImageInput(\'{model.type.name}\')"></div>\n'
-	html += f'	</div>\n'
+	# Create HTML for gallery without quadratic string concatenation
+	parts = \
+	[
+		f'<div class="sd-mm-gallery">\n',
+		f'	<div class="sd-mm-actions">\n',
+		f'		<div class="sd-mm-action sd-mm-add" title="Add Image"\n',
+		f'			onclick="sdmmTriggerImageInput(\'{model.type.name}\')"></div>\n',
+		f'	</div>\n'
+	]
 
 	# Create HTML code for each image
 	for image in images:
-		html += create_image(model, image)
+		parts.append(create_image(model, image))
 
-	html += f'</div>\n'
-	return html
+	parts.append(f'</div>\n')
+	return ''.join(parts)
 
 def create_file(file: download.File):
 	''' Creates HTML code for a file in the download manager '''
 
-	html =  f'<tr>\n'
-	html += f'    <td class="filename">\n'
-	html += f'        <div class="filename-container">{file.filename.full}</div>\n'
-	html += f'    </td>\n'
-	html += f'    <td class="status">{file.status.value}</td>\n'
-	html += f'    <td class="progress-bar">\n'
-	html += f'        <div class="bar-container">\n'
-	html += f'            <div class="bar" style="width: {file.percentage_hr}"></div>\n'
-	html += f'            <div class="percentage">{file.percentage_hr}</div>\n'
-	html += f'        </div>\n'
-	html += f'    </div>\n'
-	html += f'    <td class="info">{file.speed_hr}</td>\n'
-	html += f'    <td class="info">{file.progress_hr}</td>\n'
-	html += f'    <td class="info">{file.estimated_time_hr}</td>\n'
-	html += f'</tr>\n'
+	# Reuse the cached row while the displayed values are unchanged
+	key = \
+	(
+		file.filename.full, file.status.value, file.percentage_hr,
+		file.speed_hr, file.progress_hr, file.estimated_time_hr
+	)
+	cached = getattr(file, '_row_cache', None)
+	if cached is not None and cached[0] == key:
+		return cached[1]
+
+	html = \
+	(
+		f'<tr>\n'
+		f'    <td class="filename">\n'
+		f'        <div class="filename-container">{file.filename.full}</div>\n'
+		f'    </td>\n'
+		f'    <td class="status">{file.status.value}</td>\n'
+		f'    <td class="progress-bar">\n'
+		f'        <div class="bar-container">\n'
+		f'            <div class="bar" style="width: {file.percentage_hr}"></div>\n'
+		f'            <div class="percentage">{file.percentage_hr}</div>\n'
+		f'        </div>\n'
+		f'    </div>\n'
+		f'    <td class="info">{file.speed_hr}</td>\n'
+		f'    <td class="info">{file.progress_hr}</td>\n'
+		f'    <td class="info">{file.estimated_time_hr}</td>\n'
+		f'</tr>\n'
+	)
+
+	file._row_cache = (key, html)
 	return html
 
 def create_manager(files: list[download.File]):
 	''' Creates HTML code for the download manager '''
 
-	html = '<table class="sd-mm-download-manager">\n'
-	for file in files:
-		html += create_file(file)
-	html += '</table>\n'
-	return html
\ No newline at end of file
+	rows = [create_file(file) for file in files]
+	return '<table class="sd-mm-download-manager">\n' + ''.join(rows) + '</table>\n'
\ No newline at end of file
@@ -1,13 +1,14 @@
-import time
+import re
 import gradio as gr
 from pathlib import Path
-from typing	import Literal, cast
+from typing	import Literal, NamedTuple, cast
 from tempfile import _TemporaryFileWrapper
 
 # SD Webui Modules
 from modules import ui
 
 # Extension Library
+from library import paths
 from library import local
 from library import logger
 from library import civitai
@@ -22,6 +23,62 @@ from library.ui import html_blocks
 # Logger
 LOGGER = logger.configure()
 
+# Per-type model table cache
+TABLE_CACHE: dict[civitai.Model.Type, tuple[tuple[int, int], list[list], list[list], list[str]]] = {}
+TABLE_GENERATION = 0
+
+# Maximum number of rows shown in the dataframe at once
+PAGE_SIZE = 200
+
+def truncate_table(table: list[list]):
+	''' Limit a table to one page, noting how many rows are hidden '''
+
+	if len(table) <= PAGE_SIZE:
+		return table
+
+	hidden = len(table) - PAGE_SIZE
+	notice = [f'... {hidden} more, refine the search'] + [''] * (len(local.Model.table_header()) - 1)
+	return table[:PAGE_SIZE] + [notice]
+
+def invalidate_table_cache():
+	''' Drop the cached model tables after a model mutation '''
+	global TABLE_GENERATION
+	TABLE_GENERATION += 1
+
+# Markdown file content cache
+MARKDOWN_CACHE: dict[Path, tuple[int, str]] = {}
+
+def read_markdown(file: Path) -> str:
+	''' Read a markdown file, reusing the cached text while it is unchanged on disk '''
+
+	mtime = file.stat().st_mtime_ns
+	cached = MARKDOWN_CACHE.get(file)
+	if cached is not None and cached[0] == mtime:
+		return cached[1]
+
+	text = file.read_text(encoding= 'utf-8')
+	MARKDOWN_CACHE[file] = (mtime, text)
+	return text
+
+# Per-model gallery HTML cache
+GALLERY_CACHE: dict[str, tuple[tuple, str]] = {}
+
+def create_gallery_cached(model: local.Model):
+	''' Gallery HTML of a model, reused while its images and preview are unchanged '''
+
+	# The images directory mtime and the preview target invalidate the entry
+	mtime = paths.IMAGES_DIR.stat().st_mtime_ns if paths.IMAGES_DIR.exists() else 0
+	preview = model.preview_target_name() if model.has_preview else ''
+	key = (mtime, preview, Settings.hide_nsfw_images())
+
+	cached = GALLERY_CACHE.get(model.key)
+	if cached is not None and cached[0] == key:
+		return cached[1]
+
+	html = html_blocks.create_gallery(model)
+	GALLERY_CACHE[model.key] = (key, html)
+	return html
+
 class SearchBar:
 	''' Search bar component for the model tab '''
 
@@ -49,7 +106,7 @@ class SearchBar:
 					self.refresh = gr.Button(ui.refresh_symbol, elem_id= f'sd_mm_refresh_{type.name.lower()}')
 
 			# Model table
-			table = [row[:-1] for row in get_model_table(type)]
+			table = truncate_table(get_stripped_table(type))
 			self.table = gr.Dataframe(table, headers= local.Model.table_header(), elem_id= f'sd_mm_dataframe_{type.name.lower()}')
 
 class Gallery:
@@ -121,11 +178,11 @@ class CivitaiActions:
 					type = model.type.name.lower()
 
 					def images_status():
-						return get_component_status(model)['civitai.download_images']
+						return get_component_status(model).civitai_download_images
 					def vae_status():
-						return get_component_status(model)['civitai.download_vae']
+						return get_component_status(model).civitai_download_vae
 					def latest_status():
-						return get_component_status(model)['civitai.download_latest']
+						return get_component_status(model).civitai_download_latest
 
 					# Civitai buttons
 					self.scan            = gr.Button('Scan', variant= 'primary')
@@ -148,29 +205,109 @@ class ModelActions:
 					# Model buttons
 					self.delete = gr.Button('Delete', variant= 'stop', elem_id= f'sd_mm_delete_{type.name.lower()}')
 
-def get_model_table(type: civitai.Model.Type):
-	''' Get a table with all the models of a given type '''
+def build_table_cache(type: civitai.Model.Type):
+	''' Build and cache the sorted model table of a given type '''
 
 	# Convert models to table rows
 	model_list = [model.to_table_row() for model in local.Model.by_type(type)]
 
-	# Return empty row if no models
+	# Use an empty row if no models, sort the table by model filename otherwise
 	if len(model_list) == 0:
-		return [[''] * len(local.Model.table_header())]
+		table = [[''] * len(local.Model.table_header())]
+	else:
+		table = sorted(model_list, key= lambda model: model[0].lower())
+
+	# The variant without the 'tags' field is cached alongside the table
+	stripped = [row[:-1] for row in table]
+
+	# Lowercase search strings are precomputed once per row
+	haystacks = ['\t'.join(map(str, row)).lower() for row in table]
 
-	# Return sorted table by model filename
-	return sorted(model_list, key= lambda model: model[0].lower())
+	generation = (TABLE_GENERATION, local.MODEL_HASH_GENERATION)
+	TABLE_CACHE[type] = (generation, table, stripped, haystacks)
+	return TABLE_CACHE[type]
+
+def table_cache(type: civitai.Model.Type):
+	''' Get the cached table entry of a given type, rebuilt after a mutation '''
+
+	generation = (TABLE_GENERATION, local.MODEL_HASH_GENERATION)
+	cached = TABLE_CACHE.get(type)
+	if cached is None or cached[0] != generation:
+		cached = build_table_cache(type)
+	return cached
+
+def get_model_table(type: civitai.Model.Type):
+	''' Get a table with all the models of a given type '''
+	return table_cache(type)[1]
+
+def get_stripped_table(type: civitai.Model.Type):
+	''' Get the model table of a given type without the 'tags' field '''
+	return table_cache(type)[2]
+
+def get_table_haystacks(type: civitai.Model.Type):
+	''' Get the lowercase search strings for the model table of a given type '''
+	return table_cache(type)[3]
+
+class ComponentStatus(NamedTuple):
+	''' Updates for every model component of the tab, in output order '''
+	view:                    dict
+	gallery_html:            dict
+	gallery_add:             dict
+	markdown_content:        dict
+	markdown_generate:       dict
+	model_name_input:        dict
+	model_name_reset:        dict
+	civitai_scan:            dict
+	civitai_update_scan:     dict
+	civitai_download_images: dict
+	civitai_download_vae:    dict
+	civitai_download_latest: dict
+
+# Per-model component status cache
+STATUS_CACHE: dict[str, tuple[tuple, ComponentStatus]] = {}
 
 def get_component_status(model: local.Model):
 	''' Get the visibility and content of all components '''
 
+	# The hidden view makes the contents irrelevant for unresolved models
+	if model.filename.full == '':
+		return ComponentStatus \
+		(
+			view= gr.update(visible= False),
+			gallery_html= gr.update(),
+			gallery_add= gr.update(),
+			markdown_content= gr.update(),
+			markdown_generate= gr.update(),
+			model_name_input= gr.update(),
+			model_name_reset= gr.update(),
+			civitai_scan= gr.update(visible= False),
+			civitai_update_scan= gr.update(visible= False),
+			civitai_download_images= gr.update(visible= False),
+			civitai_download_vae= gr.update(visible= False),
+			civitai_download_latest= gr.update(visible= False)
+		)
+
+	# The status is reused until a mutation or a relevant file changes
+	images_mtime = paths.IMAGES_DIR.stat().st_mtime_ns if paths.IMAGES_DIR.exists() else 0
+	markdown_mtime = model.markdown_file.stat().st_mtime_ns if model.has_markdown else 0
+	preview = model.preview_target_name() if model.has_preview else ''
+	key = \
+	(
+		TABLE_GENERATION, local.MODEL_HASH_GENERATION, images_mtime,
+		markdown_mtime, preview, Settings.hide_nsfw_images()
+	)
+
+	cached = STATUS_CACHE.get(model.key)
+	if cached is not None and cached[0] == key:
+		return cached[1]
+
 	all_images = len(model.all_safe_images)
 	missing_images = len(model.missing_images)
 	downloaded_images = len(model.downloaded_images)
 
 	# Markdown content text
 	if model.has_markdown:
-		markdown_content = model.markdown_file.read_text(encoding= 'utf-8')
+		markdown_content = read_markdown(model.markdown_file)
 	else:
 		markdown_content = '### Markdown'
 
@@ -188,46 +325,55 @@ def get_component_status(model: local.Model):
 	else:
 		download_images = f'Download {missing_images} Missing Images'
 
-	return \
-	{
+	status = ComponentStatus \
+	(
 		# Model options view
-		'view': gr.update(visible= model.filename.full != ''),
+		view= gr.update(visible= model.filename.full != ''),
 
 		# Gallery component
-		'gallery.html': gr.update(value= html_blocks.create_gallery(model)),
-		'gallery.add': gr.update(visible= all_images == 0),
+		gallery_html= gr.update(value= create_gallery_cached(model)),
+		gallery_add= gr.update(visible= all_images == 0),
 
 		# Markdown component
-		'markdown.content': gr.update(value= markdown_content),
-		'markdown.generate': gr.update(value= markdown_generate),
+		markdown_content= gr.update(value= markdown_content),
+		markdown_generate= gr.update(value= markdown_generate),
 
 		# Model name component
-		'model_name.input': gr.update(value= model.name),
-		'model_name.reset': gr.update(visible= model.in_civitai),
+		model_name_input= gr.update(value= model.name),
+		model_name_reset= gr.update(visible= model.in_civitai),
 
 		# Civitai buttons
-		'civitai.scan':            gr.update(visible= not model.has_scan),
-		'civitai.update_scan':     gr.update(visible= model.has_scan),
-		'civitai.download_images': gr.update(interactive= True, visible= missing_images > 0, value= download_images),
-		'civitai.download_vae':    gr.update(interactive= True, visible= model.vae_missing, value= 'Download VAE'),
-		'civitai.download_latest': gr.update(interactive= True, visible= model.is_updatable, value= 'Download Latest')
-	}
+		civitai_scan=            gr.update(visible= not model.has_scan),
+		civitai_update_scan=     gr.update(visible= model.has_scan),
+		civitai_download_images= gr.update(interactive= True, visible= missing_images > 0, value= download_images),
+		civitai_download_vae=    gr.update(interactive= True, visible= model.vae_missing, value= 'Download VAE'),
+		civitai_download_latest= gr.update(interactive= True, visible= model.is_updatable, value= 'Download Latest')
+	)
+
+	STATUS_CACHE[model.key] = (key, status)
+	return status
 
 def run_filter_table(model: local.Model, filter= '', mode: Literal['and', 'or']= 'and'):
-	table = get_model_table(model.type)
+	stripped = get_stripped_table(model.type)
+	haystacks = get_table_haystacks(model.type)
 
-	# Split the filter list and remove empty strings
-	filters = filter.split(',')
-	filters = [filter.strip() for filter in filters if not filter.isspace() and filter != '']
+	# Split the filter list, remove empty strings and lowercase each needle once
+	needles = filter.split(',')
+	needles = [needle.strip().lower() for needle in needles if not needle.isspace() and needle != '']
 
-	# Filter the table
-	if mode == 'and':
-		table = [row for row in table if all(filter.lower() in str(row).lower() for filter in filters)]
-	else:
-		table = [row for row in table if any(filter.lower() in str(row).lower() for filter in filters)]
+	# Serve the cached table by reference when the filter is empty
+	if len(needles) == 0:
+		table = stripped
 
-	# Remove the 'tags' field from the table
-	table = [row[:-1] for row in table]
+	# Longer needles are rarer, testing them first short-circuits all() sooner
+	elif mode == 'and':
+		needles.sort(key= len, reverse= True)
+		table = [row for row, haystack in zip(stripped, haystacks) if all(needle in haystack for needle in needles)]
+
+	# One compiled alternation replaces a substring scan per needle
+	else:
+		pattern = re.compile('|'.join(re.escape(needle) for needle in needles))
+		table = [row for row, haystack in zip(stripped, haystacks) if pattern.search(haystack)]
 
 	# Set table to empty row if no results
 	if len(table) == 0:
@@ -235,25 +381,33 @@ def run_filter_table(model: local.Model, filter= '', mode: Literal['and', 'or']=
 
 	# Get filename, model and status
 	filename = Filename(table[0][0] if len(table) == 1 and len(filter) > 0 else '')
-	model = local.Model.get(model.type, filename)
+
+	# Keep the current model when the resolved filename is unchanged
+	if filename.full != model.filename.full:
+		model = local.Model.get(model.type, filename)
 	status = get_component_status(model)
 
-	return model, table, *status.values()
+	# Only one page of results is sent to the dataframe
+	return model, truncate_table(table), *status
 
 def run_add_images(model_state: local.Model, images: list[_TemporaryFileWrapper]):
 	for image in images:
 		model_state.add_custom_image(Path(image.name))
-	return run_filter_table(model_state, model_state.filename.full)
+
+	# Added images only affect the gallery, the table and markdown are untouched
+	status = get_component_status(model_state)
+	return status.gallery_html, status.gallery_add
 
 def run_search_refresh(model: local.Model, filter: str):
 	local.clear_cache()
 	sd_webui.model.reload_filenames(model.type)
+	invalidate_table_cache()
 	return run_filter_table(model, filter)
 
 def run_markdown_generate(model: local.Model):
 	model.generate_markdown()
 	status = get_component_status(model)
-	return status['markdown.content'], status['markdown.generate']
+	return status.markdown_content, status.markdown_generate
 
 def run_model_name_save(model: local.Model, new_name: str):
 	model.rename(new_name)
@@ -266,11 +420,13 @@ def run_model_name_reset(model: local.Model):
 def run_civitai_scan(model: local.Model):
 	model.scan()
 	LOGGER.info(f'Scan complete for "{model.filename.full}"')
+	invalidate_table_cache()
 	return run_filter_table(model, model.filename.full)
 
 def run_civitai_update_scan(model: local.Model):
 	model.scan(True)
 	LOGGER.info(f'Updated scan for "{model.filename.full}"')
+	invalidate_table_cache()
 	return run_filter_table(model, model.filename.full)
 
 def run_civitai_download_images(model: local.Model):
@@ -288,10 +444,10 @@ def run_civitai_download_images(model: local.Model):
 	# Start the download manager
 	download_manager.start()
 
-	# Wait for the download to finish
+	# Wait on manager changes instead of polling on a timer
+	yield gr.update(interactive= False, value= 'Downloading...')
 	while download_manager.running:
-		yield gr.update(interactive= False, value= 'Downloading...')
-		time.sleep(0.2)
+		download_manager.wait_change(timeout= 1.0)
 
 	# Fix missing previews
 	if model.has_missing_preview:
@@ -301,7 +457,7 @@ def run_civitai_download_images(model: local.Model):
 	if download_manager.all_complete:
 		yield gr.update(interactive= False, value= 'Download Complete')
 	else:
-		yield get_component_status(model)['civitai.download_images']
+		yield get_component_status(model).civitai_download_images
 
 def run_civitai_download_vae(model: local.Model):
 	yield gr.update(interactive= False, value= 'Initializing...')
@@ -316,10 +472,10 @@ def run_civitai_download_vae(model: local.Model):
 	# Start the download manager
 	download_manager.start()
 
-	# Wait for the download to finish
+	# Wait on manager changes instead of polling on a timer
+	yield gr.update(interactive= False, value= 'Downloading...')
 	while download_manager.running:
-		yield gr.update(interactive= False, value= 'Downloading...')
-		time.sleep(0.2)
+		download_manager.wait_change(timeout= 1.0)
 
 	# Handle the downloaded VAEs
 	if vae_entity.complete:
@@ -329,7 +485,7 @@ def run_civitai_download_vae(model: local.Model):
 	if download_manager.all_complete:
 		yield gr.update(interactive= False, value= 'Download Complete')
 	else:
-		yield get_component_status(model)['civitai.download_vae']
+		yield get_component_status(model).civitai_download_vae
 
 def run_civitai_download_latest(model: local.Model):
 	yield gr.update(interactive= False, value= 'Initializing...')
@@ -344,7 +500,7 @@ def run_civitai_download_latest(model: local.Model):
 
 	# Do not download images if the model entity is invalid
 	if latest_entity.status == download.File.Status.INVALID:
-		yield get_component_status(model)['civitai.download_latest']
+		yield get_component_status(model).civitai_download_latest
 		return
 
 	# Create image entities and enqueue if auto image download is enabled
@@ -359,10 +515,10 @@ def run_civitai_download_latest(model: local.Model):
 	# Start the download manager
 	download_manager.start()
 
-	# Wait for the download to finish
+	# Wait on manager changes instead of polling on a timer
+	yield gr.update(interactive= False, value= 'Downloading...')
 	while download_manager.running:
-		yield gr.update(interactive= False, value= 'Downloading...')
-		time.sleep(0.2)
+		download_manager.wait_change(timeout= 1.0)
 
 	# Remove image entities if main download is not complete
 	if not latest_entity.complete:
@@ -378,10 +534,11 @@ def run_civitai_download_latest(model: local.Model):
 	if download_manager.all_complete:
 		yield gr.update(interactive= False, value= 'Download Complete')
 	else:
-		yield get_component_status(model)['civitai.download_latest']
+		yield get_component_status(model).civitai_download_latest
 
 def run_model_delete(model: local.Model):
 	model.delete()
+	invalidate_table_cache()
 	return ''
 
 def component(type: civitai.Model.Type):
@@ -446,11 +603,11 @@ def component(type: civitai.Model.Type):
 			markdown.generate
 		]
 
-		# Image input
-		image_input.upload(run_add_images, [model_state, image_input], search_outputs)
+		# Image input, only the gallery components change when images are added
+		image_input.upload(run_add_images, [model_state, image_input], [gallery.html, gallery.add])
 
 		# Search bar
-		search.input.change(run_filter_table, search_inputs, search_outputs)
+		search.input.change(run_filter_table, search_inputs, search_outputs, show_progress= False)
 		search.clear.click(lambda: '', outputs= [search.input])
 		search.refresh.click(run_search_refresh, [model_state, search.input], search_outputs)
 
@@ -25,10 +25,14 @@ def run_txt2img(request: str):
 	# Get the image
 	model = local.Model.get(civitai.Model.Type[type], Filename(filename))
 	image_file = cast(Path, model.image_by_index(int(index)))
-	image = Image.open(image_file)
 
-	# Resize the image to load faster, only the metadata is needed
-	image.thumbnail((1, 1), Image.Resampling.NEAREST)
+	# Only the metadata is needed, reading it does not decode the pixels
+	with Image.open(image_file) as source:
+		info = source.info
+
+	# A tiny placeholder image carries the metadata to the info reader
+	image = Image.new('RGB', (1, 1))
+	image.info.update(info)
 
 	# Return the info and image
 	return run_pnginfo(image)[1], image
@@ -1,20 +1,54 @@
+import os
 import re
 import json
+import mmap
 import hashlib
-from PIL import Image
-from typing import Any
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
 from pathlib import Path
-from PIL.PngImagePlugin import PngInfo
-from modules.images import read_info_from_image
+from concurrent.futures import ThreadPoolExecutor
+
+# This module is dominated by syscalls, regex and JSON work, keep the hot paths
+# on the C-backed stdlib routines and do not add JIT or native dependencies
 
 # Extension Library
 import library.logger as logger
 
+# Faster JSON parsing when available
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
 # Logger
 LOGGER = logger.configure()
 
-# JSON Cache
-JSON_CACHE: dict[Path, Any] = {}
+# JSON cache of modification time and data, bounded to the most recently used files
+# The lock guards the eviction and recency updates against concurrent readers
+JSON_CACHE: OrderedDict[Path, tuple[int, Any]] = OrderedDict()
+JSON_CACHE_MAX_ENTRIES = 256
+JSON_CACHE_LOCK = threading.RLock()
+
+# SHA256 results keyed by resolved path, mtime and size
+SHA256_CACHE: dict[tuple[str, int, int], str] = {}
+
+# PNG file signature
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Size unit labels and divisors from kilobytes
+SIZE_UNITS = (('KB', 1.0), ('MB', 1024.0), ('GB', 1024.0 * 1024.0))
+
+# Precompiled filename component patterns
+NAME_PATTERN      = re.compile(r'^(.*?)(\.[^\d]|\.[^.]*$|$)')
+PREFIX_PATTERN    = re.compile(r'(\.[^\d].*)\.')
+EXTENSION_PATTERN = re.compile(r'(\.[^.]*)$')
+
+@functools.lru_cache(maxsize= 8)
+def index_pattern(separator: str):
+	''' Compiled trailing index pattern for the given separator '''
+	return re.compile(rf'{re.escape(separator)}(\d+)$')
 
 class Hashable:
 	''' Hashable object that can be used in a set '''
@@ -31,9 +65,19 @@ class Hashable:
 class Filename:
 	''' Represents the final part of a path composed of a name, prefix and extension '''
 
+	__slots__ = ('_filename', '_name', '_prefix', '_extension')
+
 	def __init__(self, filename: str | Path):
 		self._filename = Path(filename).name
 
+		# Parse the components once, the property accessors are attribute reads
+		search = NAME_PATTERN.search(self._filename)
+		self._name = str(search.group(1)) if search is not None else ''
+		search = PREFIX_PATTERN.search(self._filename)
+		self._prefix = str(search.group(1)) if search is not None else ''
+		search = EXTENSION_PATTERN.search(self._filename)
+		self._extension = str(search.group(1)) if search is not None else ''
+
 	def __str__(self):
 		return self.full
 
@@ -53,51 +97,66 @@ class Filename:
 	@property
 	def name(self):
 		''' Returns the name component of the filename '''
-
-		search = re.search(r'^(.*?)(\.[^\d]|\.[^.]*$|$)', self.full)
-		return str(search.group(1)) if search is not None else ''
+		return self._name
 
 	@property
 	def prefix(self):
 		''' Returns the prefix component of the filename '''
-
-		search = re.search(r'(\.[^\d].*)\.', self.full)
-		return str(search.group(1)) if search is not None else ''
+		return self._prefix
 
 	@property
 	def extension(self):
 		''' Returns the extension of the filename '''
-
-		search = re.search(r'(\.[^.]*)$', self.full)
-		return str(search.group(1)) if search is not None else ''
+		return self._extension
 
 	def with_name(self, name: str):
 		''' Returns a new filename with the given name component '''
-		return Filename(f'{name}{self.prefix}{self.extension}')
+		return Filename(f'{name}{self._prefix}{self._extension}')
 
 	def with_prefix(self, prefix: str):
 		''' Returns a new filename with the given prefix component '''
-		return Filename(f'{self.name}{prefix}{self.extension}')
+		return Filename(f'{self._name}{prefix}{self._extension}')
 
 	def with_extension(self, extension: str):
 		''' Returns a new filename with the given extension component '''
-		return Filename(f'{self.name}{self.prefix}{extension}')
+		return Filename(f'{self._name}{self._prefix}{extension}')
 
 	def with_index(self, index: int | None, separator= '.'):
 		''' Returns a new filename with the given index component '''
 
 		if index is None: return Filename(self.full)
-		return self.with_name(f'{self.name}{separator}{index}')
+		return self.with_name(f'{self._name}{separator}{index}')
 
 	def get_index(self, separator= '.'):
 		''' Returns the index component of the filename if it exists '''
 
-		search = re.findall(rf'{re.escape(separator)}(\d+)', self.name)
-		return int(search[-1]) if len(search) > 0 else None
+		search = index_pattern(separator).search(self._name)
+		return int(search.group(1)) if search is not None else None
 
 	def find_nonexistent(self, directory: Path, separator= '.'):
 		''' Returns a new filename with the next available index component in the given directory '''
 
+		# One directory snapshot replaces a stat syscall per candidate
+		try:
+			with os.scandir(directory) as entries:
+				existing = {entry.name for entry in entries}
+		except OSError:
+			existing = None
+
+		# Resolve the index against the in-memory snapshot
+		if existing is not None:
+			if self.full not in existing:
+				return Filename(self.full)
+
+			# Count up building one candidate string per attempt, no regex in the loop
+			index = self.get_index(separator)
+			index = 0 if index is None else index + 1
+			suffix = f'{self._prefix}{self._extension}'
+			while f'{self._name}{separator}{index}{suffix}' in existing:
+				index += 1
+			return Filename(f'{self._name}{separator}{index}{suffix}')
+
+		# Fall back to probing the disk when the directory cannot be scanned
 		file = directory / self.full
 		while file.exists():
 			index = Filename(file).get_index(separator)
@@ -115,15 +174,55 @@ def truncate(string: str, length: int):
 	''' Truncates a string to a given length '''
 	return (string[:length] + '...') if len(string) > length else string
 
-def file_sha256(file: Path, chunk_size= 1 << 22):
-	''' Calculates the SHA256 hash of a file '''
+def file_sha256(file: Path, chunk_size= 1 << 20):
+	''' Calculates the SHA256 hash of a file, memoized while the file is unchanged '''
+
+	# Serve the cached hash while the file stats match
+	stat = file.stat()
+	key = (str(file.resolve()), stat.st_mtime_ns, stat.st_size)
+	cached = SHA256_CACHE.get(key)
+	if cached is not None:
+		return cached
 
 	LOGGER.info(f'Calculating SHA256 hash of "{file.name}"')
 	sha256_hash = hashlib.sha256()
 	with file.open('rb') as file_handle:
-		for chunk in iter(lambda: file_handle.read(chunk_size), b''):
-			sha256_hash.update(chunk)
-	return sha256_hash.hexdigest().upper()
+
+		# Hint sequential access so the kernel readahead matches the streaming hash
+		if hasattr(os, 'posix_fadvise'):
+			os.posix_fadvise(file_handle.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+		# The C-driven digest loop avoids mapping multi-GB files into memory
+		if hasattr(hashlib, 'file_digest'):
+			sha256_hash = hashlib.file_digest(file_handle, 'sha256')
+
+		else:
+			# Hash the whole memory-mapped file in a single update
+			try:
+				with mmap.mmap(file_handle.fileno(), 0, access= mmap.ACCESS_READ) as mapped_file:
+					sha256_hash.update(mapped_file)
+
+			# Fall back to a reusable buffer, no bytes allocation per chunk
+			except (ValueError, OSError):
+				buffer = bytearray(chunk_size)
+				view = memoryview(buffer)
+				while (count := file_handle.readinto(buffer)):
+					sha256_hash.update(view[:count])
+
+	SHA256_CACHE[key] = sha256_hash.hexdigest().upper()
+	return SHA256_CACHE[key]
+
+def file_sha256_many(files: list[Path], workers: Optional[int]= None):
+	''' Calculates the SHA256 hashes of multiple files concurrently '''
+
+	if len(files) == 0:
+		return []
+
+	# Hashing releases the GIL, a few threads overlap the reads and digests
+	if workers is None:
+		workers = min(len(files), os.cpu_count() or 4)
+	with ThreadPoolExecutor(max_workers= workers) as executor:
+		return list(executor.map(file_sha256, files))
 
 def rename_file(file: Path, new_name: str, indexed= False):
 	''' Renames a file '''
@@ -137,42 +236,85 @@ def rename_file(file: Path, new_name: str, indexed= False):
 def clear_json_cache():
 	''' Clear JSON file cache '''
 
-	global JSON_CACHE; JSON_CACHE = {}
+	global JSON_CACHE
+	with JSON_CACHE_LOCK:
+		JSON_CACHE = OrderedDict()
 	LOGGER.debug('Cleared JSON file cache')
 
 def store_json(file: Path, data: Any):
 	''' Stores data in a JSON file '''
 
-	with file.open('w') as file_handle:
-		json.dump(data, file_handle, indent= 4)
-		JSON_CACHE[file] = data
+	# Serialize in C when available
+	if orjson is not None:
+		file.write_bytes(orjson.dumps(data, option= orjson.OPT_INDENT_2))
+	else:
+		with file.open('w') as file_handle:
+			json.dump(data, file_handle, indent= 4)
+
+	# Cache the written data so subsequent reads do not re-parse
+	cache_json(file, file.stat().st_mtime_ns, data)
+
+def cache_json(file: Path, mtime_ns: int, data: Any):
+	''' Insert a JSON entry, evicting the least recently used ones over the limit '''
+
+	with JSON_CACHE_LOCK:
+		JSON_CACHE[file] = (mtime_ns, data)
+		JSON_CACHE.move_to_end(file)
+		while len(JSON_CACHE) > JSON_CACHE_MAX_ENTRIES:
+			JSON_CACHE.popitem(last= False)
 
 def load_json(file: Path, default: Any= None):
 	''' Loads data from a JSON file '''
 
 	# Return default value if file does not exist
-	if not file.exists():
+	try:
+		mtime_ns = file.stat().st_mtime_ns
+	except OSError:
 		return default
 
-	# Load JSON file if not cached
-	elif file not in JSON_CACHE:
-		with file.open('r') as file_handle:
-			JSON_CACHE[file] = json.load(file_handle)
+	# Serve the cached data while the file is unchanged on disk
+	with JSON_CACHE_LOCK:
+		cached = JSON_CACHE.get(file)
+		if cached is not None and cached[0] == mtime_ns:
+			JSON_CACHE.move_to_end(file)
+			return cached[1]
 
-	# Return cached JSON file
-	return JSON_CACHE[file]
+	# Load and cache the JSON file
+	if orjson is not None:
+		data = orjson.loads(file.read_bytes())
+	else:
+		with file.open('r') as file_handle:
+			data = json.load(file_handle)
+	cache_json(file, mtime_ns, data)
+	return data
 
 def get_related_files(directories: list[Path], extensions: list[str], filename: Filename):
 	''' Returns a list of files that have a matching name component in a list of directories '''
 
+	# Repeated queries filter the cached snapshot with no directory syscall
+	suffixes = frozenset(extensions)
+	prefix = f'{filename.name}.'
 	related_files: list[Path] = []
 	for directory in directories:
-		for related_file in directory.glob(f'{filename.name}.*'):
-			if related_file.suffix in extensions and not related_file.is_symlink():
-				related_files.append(related_file)
+		try:
+			mtime_ns = os.stat(directory).st_mtime_ns
+			entries = directory_snapshot(str(directory), mtime_ns)
+		except OSError:
+			continue
+		for name in entries:
+			if not name.startswith(prefix):
+				continue
+			file = directory / name
+			if os.path.splitext(name)[1] in suffixes and not file.is_symlink():
+				related_files.append(file)
 	related_files.sort()
 	return related_files
 
+@functools.lru_cache(maxsize= 64)
+def directory_snapshot(directory: str, mtime_ns: int) -> tuple[str, ...]:
+	''' Entry names of a directory, cached per modification time '''
+	return tuple(os.listdir(directory))
+
 def path_in_list(path: Path, paths: list[Path]):
 	''' Returns True if a path exists in a list of paths '''
 
@@ -189,12 +331,28 @@ def path_in_list(path: Path, paths: list[Path]):
 def get_directories(paths: list[Path | None]):
 	''' Returns a list of unique directories from a list of paths '''
 
+	# Each path is resolved once, membership is a set lookup on the canonical form
 	directories: list[Path] = []
+	seen: set[Path] = set()
 	for path in paths:
-		if path is not None and path.is_dir() and not path_in_list(path, directories):
+		if path is None or not path.is_dir():
+			continue
+		key = path.resolve()
+		if key not in seen:
+			seen.add(key)
 			directories.append(path)
 	return directories
 
+def directory_index(directories: list[Path]) -> dict[str, Path]:
+	''' Map of entry names to paths, built from one scan of each directory '''
+
+	index: dict[str, Path] = {}
+	for directory in directories:
+		with os.scandir(directory) as entries:
+			for entry in entries:
+				index.setdefault(entry.name, Path(entry.path))
+	return index
+
 def find_file(directories: list[Path], filename: Filename):
 	''' Returns the first existing file from a list of directories '''
 
@@ -207,38 +365,41 @@ def find_file(directories: list[Path], filename: Filename):
 def format_size_hr(kilobytes: float):
 	''' Formats a size in Kylobytes to a human readable string '''
 
-	if kilobytes < 1024:
-		return f'{kilobytes:.0f} KB' if kilobytes.is_integer() else f'{kilobytes:.0f} KB'
-	elif kilobytes < 1024 * 1024:
-		megabytes = kilobytes / 1024
-		return f'{megabytes:.0f} MB' if megabytes.is_integer() else f'{megabytes:.2f} MB'
-	else:
-		gigabytes = kilobytes / (1024 * 1024)
-		return f'{gigabytes:.0f} GB' if gigabytes.is_integer() else f'{gigabytes:.2f} GB'
+	index = 0 if kilobytes < 1024 else 1 if kilobytes < 1024 * 1024 else 2
+	label, divisor = SIZE_UNITS[index]
+	value = kilobytes / divisor
+	if index == 0 or value.is_integer():
+		return f'{value:.0f} {label}'
+	return f'{value:.2f} {label}'
 
 def format_time_hr(seconds: float):
 	''' Formats a time in seconds to a human readable string '''
 
 	if seconds < 60:
 		return f'{seconds:.1f} sec'
-	elif seconds < 60 * 60:
-		minutes = seconds / 60
-		seconds = seconds % 60
+	minutes, seconds = divmod(seconds, 60)
+	if minutes < 60:
 		return f'{minutes:.0f}:{seconds:02.0f} min'
-	else:
-		hours = seconds / (60 * 60)
-		minutes = (seconds % (60 * 60)) / 60
-		return f'{hours:.0f}:{minutes:02.0f} hr'
+	hours, minutes = divmod(minutes, 60)
+	return f'{hours:.0f}:{minutes:02.0f} hr'
 
 def image_has_parameters(image_file: Path):
 	''' Returns true if an image has parameters '''
 
+	# PIL is imported on first use to keep extension startup fast
+	from PIL import Image
+
 	image = Image.open(image_file)
 	return 'parameters' in image.info
 
 def image_to_png(directory: Path, filename: Filename):
 	''' Converts an image to PNG '''
 
+	# The image stack is only needed for actual conversions
+	from PIL import Image
+	from PIL.PngImagePlugin import PngInfo
+	from modules.images import read_info_from_image
+
 	# Skip if image is already a PNG
 	if filename.extension == '.png':
 		return directory / filename.full
@@ -246,20 +407,27 @@ def image_to_png(directory: Path, filename: Filename):
 	# Get image paths
 	image_file = directory / filename.full
 	png_image_file = image_file.with_suffix('.png')
+
+	# Rename instead of re-encoding when the file already holds PNG data
+	with image_file.open('rb') as image_handle:
+		if image_handle.read(8) == PNG_SIGNATURE:
+			return image_file.rename(png_image_file)
+
 	LOGGER.debug(f'Converting image "{image_file}" to PNG')
 
 	# Read metadata from original image and save it to PNG
+	# A fast compression level trades some file size for a much cheaper encode
 	with Image.open(image_file) as image:
 		try:
 			info = PngInfo()
 			exif = read_info_from_image(image)[0]
 			info.add_text('parameters', exif)
-			image.save(png_image_file, pnginfo= info)
+			image.save(png_image_file, pnginfo= info, compress_level= 1)
 
 		# Save image without metadata if it fails
 		except:
 			LOGGER.debug(f'Failed to read metadata from image "{filename.full}"')
-			image.save(png_image_file)
+			image.save(png_image_file, compress_level= 1)
 
 	# Delete original image
 	image_file.unlink()